@@ -128,18 +128,31 @@ autodoc_default_options = {
 autodoc_typehints = "both"
 
 # -- Options for C autodoc ------------------------------------------------
-if "win" in sys.platform:
-    from clang.cindex import Config
-    llvm_paths = [p for p in os.environ["path"].split(";") if "llvm" in p.lower()]
-    if len(llvm_paths) > 0:
-        Config.set_library_path(llvm_paths[0])
-    # Config.set_library_file('libclang.dll')
-if 'READTHEDOCS' in os.environ:
-    from clang.cindex import Config
-    Config.set_library_file("/usr/lib/llvm-14/lib/libclang.so.1")
+def _configure_libclang(app):
+    # libclang is only located once a builder has been initialised, so builders which never parse the C sources don't
+    # need to import clang at configuration time.
+    if "win" not in sys.platform and 'READTHEDOCS' not in os.environ:
+        return
+    try:
+        from clang.cindex import Config
+    except ImportError:
+        return
+
+    if "win" in sys.platform:
+        llvm_paths = [p for p in os.environ["path"].split(";") if "llvm" in p.lower()]
+        if len(llvm_paths) > 0:
+            Config.set_library_path(llvm_paths[0])
+        # Config.set_library_file('libclang.dll')
+    if 'READTHEDOCS' in os.environ:
+        Config.set_library_file("/usr/lib/llvm-14/lib/libclang.so.1")
 
 c_autodoc_roots = ["../../pySSV/shaders", ""]
-c_autodoc_compilation_args = ["-xc", "-DSPHINX_DOCS", "-include glsl_support.h"]
+# The GLSL support header is force-included into every parsed shader; it's passed to clang as two separate arguments
+# with an absolute path so that it resolves independently of the working directory, and skipped if it's missing.
+_glsl_support_header = os.path.join(os.path.abspath(here), "glsl_support.h")
+c_autodoc_compilation_args = ["-xc", "-DSPHINX_DOCS"]
+if os.path.isfile(_glsl_support_header):
+    c_autodoc_compilation_args += ["-include", _glsl_support_header]
 
 # -- Options for HTML output ----------------------------------------------
 
@@ -269,3 +282,4 @@ def setup(app):
 
     app.connect("c-autodoc-pre-process", pre_process)
     app.connect('builder-inited', add_scripts)
+    app.connect('builder-inited', _configure_libclang)
@@ -1,21 +1,49 @@
 #  Copyright (c) 2023-2024 Thomas Mathieson.
 #  Distributed under the terms of the MIT license.
-from typing import Optional, Tuple
+import importlib
+from typing import Optional, Tuple, Union, TYPE_CHECKING
 
-from .ssv_render_widget import SSVRenderWidget
-from .ssv_canvas import SSVCanvas
-from .ssv_logging import log
+if TYPE_CHECKING:
+    from .ssv_render_widget import SSVRenderWidget
+    from .ssv_canvas import SSVCanvas
+    from .ssv_logging import log
+    from .ssv_render import SSVBackend
 
-try:
-    from ._version import __version__  # type: ignore
-except ImportError:
+
+def _dev_version() -> str:
     # Fallback when using the package in dev mode without installing in editable mode with pip. It is highly
     # recommended to install the package from a stable release or in editable mode:
     # https://pip.pypa.io/en/stable/topics/local-project-installs/#editable-installs
     import warnings
 
     warnings.warn("Importing 'pySSV' outside a proper installation.")
-    __version__ = "dev"
+    return "dev"
+
+
+try:
+    from ._version import __version__  # type: ignore
+except ImportError:
+    __version__ = _dev_version()
+
+# The rendering stack (moderngl, ipywidgets, traitlets, etc...) is only imported when one of these names is first
+# accessed, keeping ``import pySSV`` cheap for callers which only need the version or the Jupyter extension hooks.
+_lazy_attrs = {
+    "SSVCanvas": ".ssv_canvas",
+    "SSVRenderWidget": ".ssv_render_widget",
+    "log": ".ssv_logging",
+}
+
+
+def __getattr__(name: str):
+    if name in _lazy_attrs:
+        value = getattr(importlib.import_module(_lazy_attrs[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attrs))
 
 
 def _jupyter_labextension_paths():
@@ -35,14 +63,15 @@ def _jupyter_nbextension_paths():
 
 # Various factory methods
 
-def canvas(size: Optional[Tuple[int, int]] = (640, 480), backend: str = "opengl",
+def canvas(size: Optional[Tuple[int, int]] = (640, 480), backend: Union[str, "SSVBackend"] = "opengl",
            gl_version: Optional[Tuple[int, int]] = None, standalone: bool = False, target_framerate: int = 60,
            use_renderdoc: bool = False, supports_line_directives: Optional[bool] = None):
     """
     Creates a new ``SSVCanvas`` which contains the render widget and manages the render context.
 
     :param size: the default resolution of the renderer as a tuple: ``(width: int, height: int)``.
-    :param backend: the rendering backend to use; currently supports: ``"opengl"``.
+    :param backend: the rendering backend to use, either an ``SSVBackend`` or its name; currently supports:
+                    ``"opengl"``.
     :param gl_version: optionally, the minimum version of OpenGL to support. Accepts a tuple of (major, minor), eg:
                        gl_version=(4, 2) for OpenGL 4.2 Core.
     :param standalone: whether the canvas should run standalone, or attempt to create a Jupyter Widget for
@@ -55,5 +84,6 @@ def canvas(size: Optional[Tuple[int, int]] = (640, 480), backend: str = "opengl"
                                      'extension not supported: GL_ARB_shading_language_include' errors, set this to
                                      ``False``.
     """
+    from .ssv_canvas import SSVCanvas
 
     return SSVCanvas(size, backend, gl_version, standalone, target_framerate, use_renderdoc, supports_line_directives)
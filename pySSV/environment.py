@@ -5,6 +5,7 @@
 # https://github.com/InsightSoftwareConsortium/itkwidgets/blob/main/itkwidgets/integrations/environment.py Licensed
 # under the Apache License 2.0: https://github.com/InsightSoftwareConsortium/itkwidgets/blob/main/LICENSE
 from enum import Enum
+from functools import lru_cache
 import sys
 
 
@@ -17,7 +18,17 @@ class Env(Enum):
     COLAB = 'colab'
 
 
-def find_env():
+@lru_cache(maxsize=1)
+def get_env() -> Env:
+    """
+    Determines which notebook environment pySSV is running in. The result is computed on first use and cached.
+
+    :return: the detected environment.
+    """
+    if "google.colab" not in sys.modules and "IPython" not in sys.modules:
+        # Not running inside a notebook kernel; avoid paying for the (failing) imports below.
+        return Env.JUPYTERLITE if sys.platform == "emscripten" else Env.HYPHA
+
     try:
         from google.colab import files  # type: ignore
         return Env.COLAB
@@ -36,10 +47,13 @@ def find_env():
             else:
                 return Env.SAGEMAKER
         except ImportError:
-            import sys
             if sys.platform == 'emscripten':
                 return Env.JUPYTERLITE
             return Env.HYPHA
 
 
-ENVIRONMENT = find_env()
+def __getattr__(name: str):
+    # ENVIRONMENT is resolved lazily, see get_env()
+    if name == "ENVIRONMENT":
+        return get_env()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
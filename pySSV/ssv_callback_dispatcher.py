@@ -1,6 +1,6 @@
 #  Copyright (c) 2024 Thomas Mathieson.
 #  Distributed under the terms of the MIT license.
-from typing import Callable, Generic, TypeVar, Set
+from typing import Callable, Generic, TypeVar, Tuple
 
 
 T = TypeVar("T", bound=Callable[..., None])
@@ -10,10 +10,12 @@ class SSVCallbackDispatcher(Generic[T]):
     """
     A simple event callback dispatcher class similar to the ``ipywidgets.widgets.widget.CallbackDispatcher``.
     """
-    _callbacks: Set[T]
+    # Callbacks are stored in an immutable tuple which is replaced whenever a callback is added or removed; this keeps
+    # dispatching cheap and means callbacks can safely (un)register themselves while being invoked.
+    _callbacks: Tuple[T, ...]
 
     def __init__(self):
-        self._callbacks = set()
+        self._callbacks = ()
 
     # TODO: It would be good if we could find a way to impose the generic type constraint on the parameters this method
     #  takes.
@@ -30,6 +32,6 @@ class SSVCallbackDispatcher(Generic[T]):
         """
         if remove:
             if callback in self._callbacks:
-                self._callbacks.remove(callback)
-        else:
-            self._callbacks.add(callback)
+                self._callbacks = tuple(c for c in self._callbacks if c != callback)
+        elif callback not in self._callbacks:
+            self._callbacks = (*self._callbacks, callback)
@@ -6,10 +6,119 @@ import numpy as np
 import math
 from abc import ABC, abstractmethod
 from numpy import typing as npt
-from typing import Tuple
+from typing import Dict, Tuple
 
 from .ssv_logging import log
 
+try:
+    from numba import njit  # type: ignore
+except ImportError:
+    def njit(*args, **kwargs):  # type: ignore
+        # Numba isn't installed, the camera kernels just run as regular Python functions
+        def decorator(func):
+            return func
+        return decorator
+
+# The camera's pitch is kept just short of straight up/down to avoid the view matrix degenerating
+_PITCH_MAX = math.pi * 0.5 - 1e-6
+_PITCH_MIN = -_PITCH_MAX
+
+
+@njit(cache=True, fastmath=True)
+def _build_rotation_matrix(dx: float, dy: float, dz: float, ux: float, uy: float, uz: float,
+                           out: npt.NDArray[np.float32]):
+    # Writes the camera's basis vectors into the upper 3x3 columns of out.
+    # right = direction x up
+    rx = dy * uz - dz * uy
+    ry = dz * ux - dx * uz
+    rz = dx * uy - dy * ux
+    len_sq = rx * rx + ry * ry + rz * rz
+    if len_sq < 1e-12:
+        # The direction is parallel to the up vector, so use the world axis least aligned with the direction as the up
+        # vector instead
+        ax, ay, az = abs(dx), abs(dy), abs(dz)
+        if ax <= ay and ax <= az:
+            rx, ry, rz = 0.0, dz, -dy
+        elif ay <= az:
+            rx, ry, rz = -dz, 0.0, dx
+        else:
+            rx, ry, rz = dy, -dx, 0.0
+        len_sq = rx * rx + ry * ry + rz * rz
+        if len_sq < 1e-12:
+            # The direction is zero, there's no sensible basis so keep the previous one
+            return
+    inv_len = 1.0 / math.sqrt(len_sq)
+    rx *= inv_len
+    ry *= inv_len
+    rz *= inv_len
+    # up = right x direction
+    ux = ry * dz - rz * dy
+    uy = rz * dx - rx * dz
+    uz = rx * dy - ry * dx
+    inv_len = 1.0 / math.sqrt(ux * ux + uy * uy + uz * uz)
+    ux *= inv_len
+    uy *= inv_len
+    uz *= inv_len
+
+    out[0, 0] = rx
+    out[1, 0] = ry
+    out[2, 0] = rz
+    out[0, 1] = ux
+    out[1, 1] = uy
+    out[2, 1] = uz
+    out[0, 2] = dx
+    out[1, 2] = dy
+    out[2, 2] = dz
+
+
+@njit(cache=True, fastmath=True)
+def _build_view_matrix(rot: npt.NDArray[np.float32], px: float, py: float, pz: float, out: npt.NDArray[np.float32]):
+    # Equivalent to translation_matrix @ rot, only the non-constant entries of out are written.
+    for i in range(3):
+        out[0, i] = rot[0, i]
+        out[1, i] = rot[1, i]
+        out[2, i] = rot[2, i]
+        out[3, i] = -(px * rot[0, i] + py * rot[1, i] + pz * rot[2, i])
+
+
+@njit(cache=True, fastmath=True)
+def _build_projection_matrix(s: float, aspect_ratio: float, z_a: float, z_b: float, out: npt.NDArray[np.float32]):
+    # Only the non-constant entries of out are written.
+    out[0, 0] = s
+    out[1, 1] = s / aspect_ratio
+    out[2, 2] = z_a
+    out[3, 2] = z_b
+
+
+def build_view_matrices(positions: npt.ArrayLike, directions: npt.ArrayLike,
+                        up: npt.ArrayLike = (0., 1., 0.)) -> npt.NDArray[np.float32]:
+    """
+    Computes the view matrices for many cameras at once. Each resulting matrix is identical to the
+    ``SSVCamera.view_matrix`` of a camera with the same position and direction.
+
+    :param positions: an ``(N, 3)`` array of camera positions.
+    :param directions: an ``(N, 3)`` array of normalised camera directions.
+    :param up: the world space up vector shared by all the cameras.
+    :return: an ``(N, 4, 4)`` array of view matrices.
+    """
+    positions = np.asarray(positions, dtype=np.float32)
+    directions = np.asarray(directions, dtype=np.float32)
+    up = np.asarray(up, dtype=np.float32)
+
+    right = np.cross(directions, up)
+    right /= np.linalg.norm(right, axis=1, keepdims=True)
+    cam_up = np.cross(right, directions)
+    cam_up /= np.linalg.norm(cam_up, axis=1, keepdims=True)
+
+    view = np.zeros((positions.shape[0], 4, 4), dtype=np.float32)
+    view[:, :3, 0] = right
+    view[:, :3, 1] = cam_up
+    view[:, :3, 2] = directions
+    # Equivalent to translation_matrix @ rotation_matrix for each camera
+    view[:, 3, :3] = -np.einsum("ni,nij->nj", positions, view[:, :3, :3])
+    view[:, 3, 3] = 1
+    return view
+
 
 class MoveDir(Enum):
     """
@@ -29,89 +138,185 @@ class SSVCamera:
     A simple class representing a camera.
     """
 
-    position: npt.NDArray[np.float32]
-    """The camera's position in 3D space."""
-    direction: npt.NDArray[np.float32]
-    """A normalised vector pointing in the direction the camera is facing."""
-    fov: float
-    """The field of view of the camera in degrees."""
-    clip_dist: Tuple[float, float]
-    """The distances of the near and far clipping planes respectively."""
-    aspect_ratio: float
-    """The aspect ratio of the render buffer."""
+    _position: npt.NDArray[np.float32]
+    _direction: npt.NDArray[np.float32]
+    _fov: float
+    _clip_dist: Tuple[float, float]
+    _aspect_ratio: float
+    _s: float
+    _z_a: float
+    _z_b: float
+    _yaw: float
+    _pitch: float
+    _cos_yaw: float
+    _sin_yaw: float
+    _cos_pitch: float
+    _sin_pitch: float
+
     def __init__(self):
-        self.position = np.array([0., 0., 0.], dtype=np.float32)
-        self.direction = np.array([0., 0., -1.], dtype=np.float32)
-        self.fov = 60
+        self._position = np.array([0., 0., 0.], dtype=np.float32)
+        self._direction = np.array([0., 0., -1.], dtype=np.float32)
+        # Only the entries which depend on the camera's parameters are ever rewritten, the constant entries of both
+        # matrices are initialised once here.
+        self._view_matrix: npt.NDArray[np.float32] = np.zeros((4, 4), dtype=np.float32)  # type: ignore[annotation-unchecked]
+        self._view_matrix[3, 3] = 1
+        self._projection_matrix = np.zeros((4, 4), dtype=np.float32)
+        self._projection_matrix[2, 3] = -1
+        self._rotation_matrix: npt.NDArray[np.float32] = np.identity(4, dtype=np.float32)  # type: ignore[annotation-unchecked]
+        self._view_projection_matrix: npt.NDArray[np.float32] = np.empty((4, 4), dtype=np.float32)  # type: ignore[annotation-unchecked]
+        self._view_projection_dirty = True
+        # The view matrix is only rebuilt when the parameters it depends on change; the projection matrix is rebuilt
+        # immediately whenever one of its parameters is set.
+        self._view_dirty = True
+        self._rotation_dirty = True
+        self._fov = 60.
+        self._s = 1.0 / math.tan(math.radians(self._fov) / 2.0)
+        self._aspect_ratio = 1.
         self.clip_dist = (0.1, 1000.0)
-        self.aspect_ratio = 1
 
-        self._mouse_old_pos = np.array([0., 0.], dtype=np.int32)
-        self._rotation = np.array([math.pi, 0.], dtype=np.float32)
+        self._mouse_old_pos = (0, 0)
+        self._set_rotation(math.pi, 0.)
         self._mouse_was_pressed = False
-        self._view_matrix: npt.NDArray[np.float32] = np.identity(4, dtype=np.float32)  # type: ignore[annotation-unchecked]
-        self._projection_matrix = np.identity(4, dtype=np.float32)
         self._up_vec = np.array([0., 1., 0.], dtype=np.float32)
 
-    @staticmethod
-    def _cross_3d(a: npt.NDArray[np.float32], b: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
-        res: npt.NDArray[np.float32] = np.empty(3, dtype=np.float32)
-        res[0] = a[1] * b[2] - a[2] * b[1]
-        res[1] = -(a[0] * b[2] - a[2] * b[0])
-        res[2] = a[0] * b[1] - a[1] * b[0]
-        return res
+    @property
+    def position(self) -> npt.NDArray[np.float32]:
+        """Gets or sets the camera's position in 3D space."""
+        # The returned array may be modified in place by the caller
+        self._view_dirty = True
+        return self._position
+
+    @position.setter
+    def position(self, value: npt.NDArray[np.float32]):
+        self._position = np.array(value, dtype=np.float32)
+        self._view_dirty = True
+
+    @property
+    def direction(self) -> npt.NDArray[np.float32]:
+        """Gets or sets a normalised vector pointing in the direction the camera is facing."""
+        # The returned array may be modified in place by the caller
+        self._invalidate_view()
+        return self._direction
+
+    @direction.setter
+    def direction(self, value: npt.NDArray[np.float32]):
+        self._direction = np.array(value, dtype=np.float32)
+        self._invalidate_view()
+
+    @property
+    def fov(self) -> float:
+        """Gets or sets the field of view of the camera in degrees."""
+        return self._fov
+
+    @fov.setter
+    def fov(self, value: float):
+        self._fov = value
+        # The trigonometry is only evaluated when the fov changes
+        self._s = 1.0 / math.tan(math.radians(value) / 2.0)
+        self._update_projection()
+
+    @property
+    def clip_dist(self) -> Tuple[float, float]:
+        """Gets or sets the distances of the near and far clipping planes respectively."""
+        return self._clip_dist
+
+    @clip_dist.setter
+    def clip_dist(self, value: Tuple[float, float]):
+        self._clip_dist = value
+        near, far = value
+        inv_depth = 1.0 / (near - far)
+        self._z_a = far * inv_depth
+        self._z_b = near * far * inv_depth
+        self._update_projection()
+
+    @property
+    def aspect_ratio(self) -> float:
+        """Gets or sets the aspect ratio of the render buffer."""
+        return self._aspect_ratio
+
+    @aspect_ratio.setter
+    def aspect_ratio(self, value: float):
+        self._aspect_ratio = value
+        self._update_projection()
+
+    def _update_projection(self):
+        """
+        Rebuilds the projection matrix, this should be called whenever one of the projection parameters is changed.
+        """
+        _build_projection_matrix(self._s, float(self._aspect_ratio), self._z_a, self._z_b, self._projection_matrix)
+        self._view_projection_dirty = True
 
-    @staticmethod
-    def _length_3d(a: npt.NDArray[np.float32]) -> float:
-        return np.sqrt(a[0]*a[0] + a[1]*a[1] + a[2]*a[2])
+    def _set_rotation(self, yaw: float, pitch: float):
+        """
+        Sets the yaw and pitch of the camera (in radians) and caches their sines and cosines. The pitch is clamped to
+        just under +/- 90 degrees.
+        """
+        if pitch < _PITCH_MIN:
+            pitch = _PITCH_MIN
+        elif pitch > _PITCH_MAX:
+            pitch = _PITCH_MAX
+        self._yaw = yaw
+        self._pitch = pitch
+        self._cos_yaw = math.cos(yaw)
+        self._sin_yaw = math.sin(yaw)
+        self._cos_pitch = math.cos(pitch)
+        self._sin_pitch = math.sin(pitch)
+
+    def _invalidate_view(self):
+        """
+        Marks the view and rotation matrices as needing to be rebuilt, this should be called whenever the camera's
+        direction is changed.
+        """
+        self._view_dirty = True
+        self._rotation_dirty = True
 
     @property
     def rotation_matrix(self) -> npt.NDArray[np.float32]:
         """
         Gets the current view matrix of the camera, without the translation component.
         """
-        right = SSVCamera._cross_3d(self.direction, self._up_vec)
-        right /= SSVCamera._length_3d(right)
-        up = SSVCamera._cross_3d(right, self.direction)
-        up /= SSVCamera._length_3d(up)
-        rot_matrix: npt.NDArray[np.float32] = np.identity(4, dtype=np.float32)
-        rot_matrix[0:3, 0] = right
-        rot_matrix[0:3, 1] = up
-        rot_matrix[0:3, 2] = self.direction
-        return rot_matrix
+        if not self._rotation_dirty:
+            return self._rotation_matrix
+        self._rotation_dirty = False
+
+        dx, dy, dz = self._direction.tolist()
+        ux, uy, uz = self._up_vec.tolist()
+        _build_rotation_matrix(dx, dy, dz, ux, uy, uz, self._rotation_matrix)
+        return self._rotation_matrix
 
     @property
     def view_matrix(self) -> npt.NDArray[np.float32]:
         """
         Gets the current view matrix of the camera.
         """
-        # noinspection PyTypeChecker
-        self._view_matrix = np.array((
-            (1, 0, 0, 0),
-            (0, 1, 0, 0),
-            (0, 0, 1, 0),
-            (-self.position[0], -self.position[1], -self.position[2], 1),
-        ), dtype=np.float32) @ self.rotation_matrix
-
-        # noinspection PyTypeChecker
+        if not self._view_dirty:
+            return self._view_matrix
+        self._view_dirty = False
+
+        # The rotation matrix is cached separately, so it's only recomputed if the direction has changed
+        px, py, pz = self._position.tolist()
+        _build_view_matrix(self.rotation_matrix, px, py, pz, self._view_matrix)
+        self._view_projection_dirty = True
         return self._view_matrix
 
     @property
-    def projection_matrix(self):
+    def projection_matrix(self) -> npt.NDArray[np.float32]:
         """
         Gets the current projection matrix of the camera.
         """
-        s = 1.0 / math.tan(math.radians(self.fov) / 2.0)
-        s1 = s / self.aspect_ratio
-        self._projection_matrix[0, 0] = s
-        self._projection_matrix[1, 1] = s1
-        self._projection_matrix[2, 2] = self.clip_dist[1] / (self.clip_dist[0] - self.clip_dist[1])
-        self._projection_matrix[2, 3] = -1
-        self._projection_matrix[3, 2] = ((self.clip_dist[0] * self.clip_dist[1])
-                                         / (self.clip_dist[0] - self.clip_dist[1]))
-        self._projection_matrix[3, 3] = 0
         return self._projection_matrix
 
+    @property
+    def view_projection_matrix(self) -> npt.NDArray[np.float32]:
+        """
+        Gets the combined view and projection matrix of the camera (``view_matrix @ projection_matrix``).
+        """
+        view = self.view_matrix
+        if self._view_projection_dirty:
+            np.dot(view, self._projection_matrix, out=self._view_projection_matrix)
+            self._view_projection_dirty = False
+        return self._view_projection_matrix
+
 
 class SSVCameraController(SSVCamera, ABC):
     """
@@ -146,6 +351,16 @@ class SSVLookCameraController(SSVCameraController):
     """
     A camera controller which supports mouse look controls.
     """
+    # Maps each movement direction to the (axis, sign) of the world space position component it changes
+    _move_axes: Dict[MoveDir, Tuple[int, float]] = {
+        MoveDir.UP: (1, 1.),
+        MoveDir.DOWN: (1, -1.),
+        MoveDir.RIGHT: (0, 1.),
+        MoveDir.LEFT: (0, -1.),
+        MoveDir.FORWARD: (2, 1.),
+        MoveDir.BACKWARD: (2, -1.),
+    }
+
     def mouse_change(self, mouse_pos: Tuple[int, int], mouse_down: Tuple[bool, bool, bool]):
         """
         Updates the camera with a mouse event.
@@ -155,17 +370,24 @@ class SSVLookCameraController(SSVCameraController):
         """
         if self.inhibit:
             return
+        mx, my = mouse_pos
         if mouse_down[0]:
             if not self._mouse_was_pressed:
                 self._mouse_was_pressed = True
-                self._mouse_old_pos[:] = mouse_pos
+                self._mouse_old_pos = (mx, my)
             else:
-                self._rotation += (np.array(mouse_pos, dtype=np.int32) - self._mouse_old_pos) * self.pan_speed
-                self._rotation[1] = min(max(self._rotation[1], -math.pi/2 + 1e-6), math.pi/2 - 1e-6)
-                self.direction[0] = math.cos(self._rotation[0]) * math.cos(self._rotation[1])
-                self.direction[1] = math.sin(self._rotation[1])
-                self.direction[2] = math.sin(self._rotation[0]) * math.cos(self._rotation[1])
-                self._mouse_old_pos[:] = mouse_pos
+                old_x, old_y = self._mouse_old_pos
+                if mx == old_x and my == old_y:
+                    # The mouse hasn't moved, so neither has the camera
+                    return
+                yaw = self._yaw + (mx - old_x) * self.pan_speed
+                pitch = self._pitch + (my - old_y) * self.pan_speed
+                self._set_rotation(yaw, pitch)
+                self._direction[0] = self._cos_yaw * self._cos_pitch
+                self._direction[1] = self._sin_pitch
+                self._direction[2] = self._sin_yaw * self._cos_pitch
+                self._invalidate_view()
+                self._mouse_old_pos = (mx, my)
         else:
             self._mouse_was_pressed = False
 
@@ -179,18 +401,12 @@ class SSVLookCameraController(SSVCameraController):
         """
         if self.inhibit:
             return
-        if direction == MoveDir.UP:
-            self.position[1] += self.move_speed * distance
-        elif direction == MoveDir.DOWN:
-            self.position[1] -= self.move_speed * distance
-        elif direction == MoveDir.RIGHT:
-            self.position[0] += self.move_speed * distance
-        elif direction == MoveDir.LEFT:
-            self.position[0] -= self.move_speed * distance
-        elif direction == MoveDir.FORWARD:
-            self.position[2] += self.move_speed * distance
-        elif direction == MoveDir.BACKWARD:
-            self.position[2] -= self.move_speed * distance
+        move_axis = self._move_axes.get(direction)
+        if move_axis is None:
+            return
+        axis, sign = move_axis
+        self._position[axis] += sign * self.move_speed * distance
+        self._view_dirty = True
         # log(f"Moved position: {self.position}", severity=logging.INFO)
 
 
@@ -200,11 +416,24 @@ class SSVOrbitCameraController(SSVCameraController):
     """
     _target_pos: npt.NDArray[np.float32]
     _orbit_dist: float
+    # Maps each movement direction to the (axis, sign) of the view space vector to move the target along
+    _move_axes: Dict[MoveDir, Tuple[int, float]] = {
+        MoveDir.UP: (1, 1.),
+        MoveDir.DOWN: (1, -1.),
+        MoveDir.RIGHT: (0, 1.),
+        MoveDir.LEFT: (0, -1.),
+        MoveDir.FORWARD: (2, -1.),
+        MoveDir.BACKWARD: (2, 1.),
+    }
 
     def __init__(self):
         super().__init__()
-        self._target_pos = np.array([0, 0, 0], dtype=np.float32)
-        self._orbit_dist = 2
+        self._target_pos = np.array([0., 0., 0.], dtype=np.float32)
+        self._orbit_dist = 2.
+        # View space panning offset, only the x and y components are ever written to
+        self._pan_vec = np.zeros(4, dtype=np.float32)
+        # The pan/move offset transformed into world space
+        self._target_offset = np.zeros(4, dtype=np.float32)
 
     @property
     def target_pos(self):
@@ -213,7 +442,7 @@ class SSVOrbitCameraController(SSVCameraController):
 
     @target_pos.setter
     def target_pos(self, value):
-        self._target_pos = value
+        self._target_pos = np.array(value, dtype=np.float32)
         self._update_direction_position()
 
     @property
@@ -227,11 +456,13 @@ class SSVOrbitCameraController(SSVCameraController):
         self._update_direction_position()
 
     def _update_direction_position(self):
-        self.direction[0] = math.cos(self._rotation[0]) * math.cos(self._rotation[1])
-        self.direction[1] = math.sin(self._rotation[1])
-        self.direction[2] = math.sin(self._rotation[0]) * math.cos(self._rotation[1])
+        self._direction[0] = self._cos_yaw * self._cos_pitch
+        self._direction[1] = self._sin_pitch
+        self._direction[2] = self._sin_yaw * self._cos_pitch
 
-        self.position[:] = self._target_pos + self.direction * self._orbit_dist
+        np.multiply(self._direction, self._orbit_dist, out=self._position)
+        self._position += self._target_pos
+        self._invalidate_view()
 
     def mouse_change(self, mouse_pos: Tuple[int, int], mouse_down: Tuple[bool, bool, bool]):
         """
@@ -242,18 +473,26 @@ class SSVOrbitCameraController(SSVCameraController):
         """
         if self.inhibit:
             return
+        mx, my = mouse_pos
+        just_pressed = False
         if mouse_down[0] or mouse_down[1] or mouse_down[2]:
             if not self._mouse_was_pressed:
                 self._mouse_was_pressed = True
-                self._mouse_old_pos[:] = mouse_pos
+                self._mouse_old_pos = (mx, my)
+                just_pressed = True
         else:
             self._mouse_was_pressed = False
+        old_x, old_y = self._mouse_old_pos
+        if mx == old_x and my == old_y and not just_pressed:
+            # The mouse hasn't moved, so neither has the camera
+            return
 
         if mouse_down[0]:
             # Orbit
             if self._mouse_was_pressed:
-                self._rotation -= (np.array(mouse_pos, dtype=np.int32) - self._mouse_old_pos) * self.pan_speed
-                self._rotation[1] = min(max(self._rotation[1], -math.pi/2 + 1e-6), math.pi/2 - 1e-6)
+                yaw = self._yaw - (mx - old_x) * self.pan_speed
+                pitch = self._pitch - (my - old_y) * self.pan_speed
+                self._set_rotation(yaw, pitch)
 
                 self._update_direction_position()
 
@@ -261,9 +500,10 @@ class SSVOrbitCameraController(SSVCameraController):
         elif mouse_down[2]:
             # Pan
             if self._mouse_was_pressed:
-                mouse_delta = np.append((np.array(mouse_pos, dtype=np.float32) - self._mouse_old_pos) * self.pan_speed,
-                                        (0, 0))
-                self._target_pos += (self.rotation_matrix @ mouse_delta)[:3]
+                self._pan_vec[0] = (mx - old_x) * self.pan_speed
+                self._pan_vec[1] = (my - old_y) * self.pan_speed
+                np.dot(self.rotation_matrix, self._pan_vec, out=self._target_offset)
+                self._target_pos += self._target_offset[:3]
 
                 self._update_direction_position()
 
@@ -272,7 +512,7 @@ class SSVOrbitCameraController(SSVCameraController):
             # Zoom
             pass
 
-        self._mouse_old_pos[:] = mouse_pos
+        self._mouse_old_pos = (mx, my)
 
     def zoom(self, distance: float):
         """
@@ -295,20 +535,14 @@ class SSVOrbitCameraController(SSVCameraController):
         """
         if self.inhibit:
             return
-        dir_vec: npt.NDArray[np.float32] = np.zeros(4, dtype=np.float32)
-        if direction == MoveDir.UP:
-            dir_vec[1] = self.move_speed * distance
-        elif direction == MoveDir.DOWN:
-            dir_vec[1] = -self.move_speed * distance
-        elif direction == MoveDir.RIGHT:
-            dir_vec[0] = self.move_speed * distance
-        elif direction == MoveDir.LEFT:
-            dir_vec[0] = -self.move_speed * distance
-        elif direction == MoveDir.FORWARD:
-            dir_vec[2] = -self.move_speed * distance
-        elif direction == MoveDir.BACKWARD:
-            dir_vec[2] = self.move_speed * distance
-        self._target_pos += (self.rotation_matrix @ dir_vec)[:3]
+        move_axis = self._move_axes.get(direction)
+        if move_axis is None:
+            return
+        axis, sign = move_axis
+        # Moving along a single view space axis is just a scaled column of the rotation matrix
+        offset = self._target_offset[:3]
+        np.multiply(self.rotation_matrix[:3, axis], sign * self.move_speed * distance, out=offset)
+        self._target_pos += offset
         self._update_direction_position()
         # log(f"Moved position: {self.position}", severity=logging.INFO)
 
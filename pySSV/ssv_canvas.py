@@ -1,11 +1,13 @@
 #  Copyright (c) 2023-2024 Thomas Mathieson.
 #  Distributed under the terms of the MIT license.
+import importlib.util
 import logging
 import time
-from typing import Optional, Any, Union, Callable, Dict, List, Tuple
-from threading import Thread
+import weakref
+from typing import TYPE_CHECKING, Optional, Any, Union, Callable, Dict, List, Tuple
+from threading import Thread, Event, Lock
+import numpy as np
 import numpy.typing as npt
-from PIL import Image
 import sys
 if sys.version_info >= (3, 10):
     from typing import TypeAlias
@@ -14,7 +16,7 @@ else:
 
 from .ssv_camera import SSVCameraController, SSVOrbitCameraController, SSVLookCameraController, MoveDir
 from .ssv_render_process_client import SSVRenderProcessClient
-from .ssv_render import SSVStreamingMode
+from .ssv_render import SSVStreamingMode, SSVBackend
 from .ssv_render_widget import SSVRenderWidget, SSVRenderWidgetLogIO
 from .ssv_shader_preprocessor import SSVShaderPreprocessor
 from .ssv_logging import log, set_output_stream
@@ -22,8 +24,19 @@ from .ssv_render_buffer import SSVRenderBuffer
 from .ssv_texture import SSVTexture
 from .ssv_callback_dispatcher import SSVCallbackDispatcher
 from .ssv_canvas_stream_server import SSVCanvasStreamServer
-from .environment import ENVIRONMENT, Env
+from .environment import get_env, Env
 
+if TYPE_CHECKING:
+    # PIL is only needed for type hints here, importing it is relatively slow
+    from PIL import Image
+
+# Banners used to format the output of SSVCanvas.dbg_preprocess_shader()
+_DBG_PREPROCESSOR_BANNER = ("/************************************************************\n"
+                            " * {:^56} *\n"
+                            " ************************************************************/\n\n")
+_DBG_STAGE_BANNER = ("////////////////////////////////////////\n"
+                     "// {:^34} //\n"
+                     "////////////////////////////////////////\n\n")
 
 OnMouseDelegate: TypeAlias = Callable[[Tuple[bool, bool, bool], Tuple[int, int], float], None]
 """
@@ -63,14 +76,39 @@ class SSVCanvas:
     An SSV canvas manages the OpenGL rendering context, shaders, and the jupyter widget
     """
 
-    def __init__(self, size: Optional[Tuple[int, int]], backend: str = "opengl",
+    __slots__ = ("_size", "_standalone", "_target_framerate", "_backend", "_use_renderdoc", "_render_timeout",
+                 "_on_start", "_on_frame_rendered", "_on_keyboard_event", "_on_mouse_event", "_widget",
+                 "_supports_websockets", "_websocket_url", "_render_process_client", "_preprocessor",
+                 "_main_render_buffer", "_render_buffer_counter", "_textures", "_texture_counter", "_mouse_pos",
+                 "_mouse_down", "_mouse_pos_dirty", "_mouse_flush_time", "_pending_uniforms", "_uniforms_lock",
+                 "_last_view_matrix", "_last_projection_matrix", "_main_camera", "_current_move_dir",
+                 "_last_run_settings", "_streaming_mode", "_paused", "_pause_time", "_start_time", "_last_frame_time",
+                 "_frame_no", "_update_frame_rate_task", "_frame_rate_task_stop", "_canvas_stream_server",
+                 "_frame_sink", "_log_stream", "_finalizer", "__weakref__")
+
+    # How often in seconds the frame rate display is updated while frames are being rendered, and the longest it waits
+    # between checks while they aren't
+    _frame_rate_update_interval = 0.5
+    _frame_rate_update_interval_max = 4.0
+
+    # Maps each key which moves the camera to the direction it moves in (supports both QWERTY and AZERTY layouts)
+    _key_move_dirs: Dict[str, MoveDir] = {
+        "ArrowUp": MoveDir.FORWARD, "w": MoveDir.FORWARD, "W": MoveDir.FORWARD, "z": MoveDir.FORWARD,
+        "Z": MoveDir.FORWARD,
+        "ArrowDown": MoveDir.BACKWARD, "s": MoveDir.BACKWARD, "S": MoveDir.BACKWARD,
+        "ArrowLeft": MoveDir.LEFT, "a": MoveDir.LEFT, "A": MoveDir.LEFT, "q": MoveDir.LEFT, "Q": MoveDir.LEFT,
+        "ArrowRight": MoveDir.RIGHT, "d": MoveDir.RIGHT, "D": MoveDir.RIGHT,
+    }
+
+    def __init__(self, size: Optional[Tuple[int, int]], backend: Union[str, SSVBackend] = "opengl",
                  gl_version: Optional[Tuple[int, int]] = None, standalone: bool = False, target_framerate: int = 60,
                  use_renderdoc: bool = False, supports_line_directives: Optional[bool] = None):
         """
         Creates a new SSV Canvas object which manages the graphics context and render widget/window.
 
         :param size: the default resolution of the renderer as a tuple: ``(width: int, height: int)``.
-        :param backend: the rendering backend to use; currently supports: ``"opengl"``.
+        :param backend: the rendering backend to use, either an ``SSVBackend`` or its name; currently supports:
+                        ``"opengl"``.
         :param gl_version: optionally, the minimum version of OpenGL to support. Accepts a tuple of (major, minor), eg:
                        gl_version=(4, 2) for OpenGL 4.2 Core.
         :param standalone: whether the canvas should run standalone, or attempt to create a Jupyter Widget for
@@ -89,6 +127,12 @@ class SSVCanvas:
         self._standalone = standalone
         self._target_framerate = target_framerate
         self._streaming_mode = SSVStreamingMode.JPG
+        if isinstance(backend, str):
+            try:
+                backend = SSVBackend(backend)
+            except ValueError:
+                raise KeyError(f"'{backend}' is not a valid rendering backend. Supported backends are: "
+                               f"{[e.value for e in SSVBackend]}")
         self._backend = backend
         self._use_renderdoc = False
         self._on_mouse_event: SSVCallbackDispatcher[OnMouseDelegate] = SSVCallbackDispatcher()
@@ -96,12 +140,13 @@ class SSVCanvas:
         self._on_frame_rendered: SSVCallbackDispatcher[OnFrameRenderedDelegate] = SSVCallbackDispatcher()
         self._on_start: SSVCallbackDispatcher[Callable[[], None]] = SSVCallbackDispatcher()
         if use_renderdoc:
-            try:
-                from pyRenderdocApp import RENDERDOC_API_1_6_0  # type: ignore
+            # Only check that the module exists, it's actually imported and loaded by the render process
+            if importlib.util.find_spec("pyRenderdocApp") is not None:
                 self._use_renderdoc = True
-            except ImportError:
+            else:
                 log("Couldn't find pyRenderdocApp module! Renderdoc will not be loaded.", severity=logging.WARN)
         self._widget = None
+        self._log_stream: Optional[SSVRenderWidgetLogIO] = None
         if not standalone:
             self._widget = SSVRenderWidget()
             self._widget.streaming_mode = self._streaming_mode.name
@@ -113,16 +158,21 @@ class SSVCanvas:
             self._widget.on_click(self.__on_click)
             self._widget.on_mouse_wheel(self.__on_mouse_wheel)
             self._widget.on_save_image(self.__on_save_image)
+            self._widget.observe(self.__on_mouse_pos_updated, names=["mouse_pos_x", "mouse_pos_y"])
             if self._use_renderdoc:
                 self._widget.on_renderdoc_capture(self.__on_renderdoc_capture)
             self._update_frame_rate_task: Optional[Thread] = None
             self._set_logging_stream()
             # set_output_stream(sys.stdout)
+        self._frame_rate_task_stop = Event()
         self._render_timeout = 10
         gl_version_int = None if gl_version is None else gl_version[0] * 100 + gl_version[1] * 10
-        self._render_process_client = SSVRenderProcessClient(backend, gl_version_int,
+        self._render_process_client = SSVRenderProcessClient(backend.value, gl_version_int,
                                                              None if standalone else self._render_timeout,
                                                              self._use_renderdoc)
+        # Unlike __del__, this is still run at interpreter exit and isn't affected by reference cycles through the
+        # canvas' callbacks
+        self._finalizer = weakref.finalize(self, SSVCanvas._shutdown, self._render_process_client)
         # Configure and initialise the preprocessor
         if supports_line_directives is None:
             supported_extensions = self._render_process_client.get_supported_extensions()
@@ -144,12 +194,25 @@ class SSVCanvas:
         self._preprocessor = SSVShaderPreprocessor(gl_version=shader_gl_version,
                                                    supports_line_directives=supports_line_directives)
 
-        self._supports_websockets = ENVIRONMENT != Env.COLAB or ENVIRONMENT != Env.JUPYTERLITE
+        self._supports_websockets = get_env() not in (Env.COLAB, Env.JUPYTERLITE)
         self._websocket_url: Optional[str] = None
         self._canvas_stream_server: Optional[SSVCanvasStreamServer] = None
+        # Where rendered frames are sent to; resolved once in run() so __on_render doesn't need to work it out per frame
+        self._frame_sink: Optional[Callable[[Union[bytes, str]], None]] = None
 
         self._mouse_pos = (0, 0)
         self._mouse_down = (False, False, False)
+        # Mouse moves are throttled to at most one update per frame, see __on_mouse_pos_updated()
+        self._mouse_pos_dirty = False
+        self._mouse_flush_time = 0.0
+        # Uniform updates made by the input handlers are collected here and sent to the render process in one go
+        self._pending_uniforms: Dict[Tuple[Optional[int], Optional[int], str], Any] = {}
+        # Uniforms are queued from both the kernel's thread (input events) and the render process client's thread (new
+        # frames), this guards the pending uniforms and the last sent matrices.
+        self._uniforms_lock = Lock()
+        # A copy of the last view matrix sent to the render process
+        self._last_view_matrix: Optional[npt.NDArray[np.float32]] = None
+        self._last_projection_matrix: Optional[npt.NDArray[np.float32]] = None
         # Cache the last parameters to the run() method for the widget's "play" button to use
         self._last_run_settings: Dict[str, Any] = {}
         self._paused = False
@@ -167,61 +230,96 @@ class SSVCanvas:
         self._current_move_dir: MoveDir = MoveDir.NONE
         self._last_frame_time = time.perf_counter()
         self._textures: Dict[str, SSVTexture] = {}
+        self._texture_counter = 0
 
-    def __del__(self):
-        self.stop()
-        self._render_process_client.stop()
+    @staticmethod
+    def _shutdown(render_process_client: SSVRenderProcessClient):
+        # Called by the canvas' finalizer; this mustn't hold a reference to the canvas, otherwise it'd never be
+        # collected.
+        try:
+            render_process_client.stop()
+        except Exception:
+            # The command queue may already have been torn down during interpreter shutdown
+            pass
 
     def __update_frame_rate_task(self):
         """
         A task to periodically update the frame rate display in the widget.
         """
-        while self._render_process_client.is_alive:
+        update_interval = self._frame_rate_update_interval
+        last_frame_no = self._frame_no
+        last_frame_times: Optional[Tuple[float, float, float, float]] = None
+        while self._render_process_client.is_alive and not self._frame_rate_task_stop.is_set():
+            # If no frames have been received since the last update (the canvas is paused or the widget isn't being
+            # displayed) then there's nothing new to show, so back off instead of polling the render process.
+            if self._paused or self._frame_no == last_frame_no:
+                update_interval = min(update_interval * 2, self._frame_rate_update_interval_max)
+                self._frame_rate_task_stop.wait(update_interval)
+                continue
+            update_interval = self._frame_rate_update_interval
+            last_frame_no = self._frame_no
+
             frame_times = self._render_process_client.get_frame_times(10)
             if frame_times is not None:
+                # Only format and sync the stats to the widget when they've changed noticeably
+                if last_frame_times is not None and all(
+                        abs(new - old) <= max(old * 0.05, 1e-4) for new, old in zip(frame_times, last_frame_times)):
+                    self._frame_rate_task_stop.wait(update_interval)
+                    continue
+                last_frame_times = frame_times
                 self._widget.frame_rate = min(1 / (frame_times[0] + frame_times[2]),
                                               self._target_framerate)  # Avg frame+encode
                 self._widget.frame_times = (
                     f"Avg {frame_times[0] * 1000:.3f} ms;Avg encode {frame_times[2] * 1000:.3f} ms;"
                     f"Max {frame_times[1] * 1000:.3f} ms;Max encode {frame_times[3] * 1000:.3f} ms")
             else:
+                last_frame_times = None
                 self._widget.frame_rate = 0
                 self._widget.frame_times = "Took longer than 10s to get stats;;;"
-            # No point making this async if get_frame_times() is blocking; might as well just spin up a new thread
-            # await asyncio.sleep(0.5)
-            time.sleep(0.5)
+            # No point making this async if get_frame_times() is blocking; might as well just spin up a new thread.
+            # Waiting on the event rather than sleeping lets stop() end the thread straight away.
+            self._frame_rate_task_stop.wait(update_interval)
 
-    def __on_render(self, stream_data: Union[bytes, str]):
+    def __on_render(self, stream_data: Optional[Union[bytes, str]]):
         self._frame_no += 1
-        if self._streaming_mode == SSVStreamingMode.MJPEG and self._canvas_stream_server is not None:
-            # log(f"Sending frame len={len(stream_data)}", severity=logging.INFO)
-            self._canvas_stream_server.send(stream_data)  # type: ignore
-        elif self._supports_websockets and self._canvas_stream_server is not None:
-            # log(f"Sending frame len={len(stream_data)}", severity=logging.INFO)
-            if isinstance(stream_data, str):
-                stream_data = stream_data.encode('utf-8')
-            self._canvas_stream_server.send(stream_data)
-        elif self._widget is not None:
-            if isinstance(stream_data, str):
-                self._widget.stream_data_ascii = stream_data
-            else:
-                self._widget.stream_data_binary = stream_data
-            # log(f"Sending frame len={len(stream_data)}", severity=logging.INFO)
-            # self._widget.send({"stream_data": len(stream_data)}, buffers=[stream_data])
+        # A frame of None means it was identical to the last one, so there's nothing new to display
+        if stream_data is not None and self._frame_sink is not None:
+            self._frame_sink(stream_data)
         t = time.perf_counter()
         delta_time = t - self._last_frame_time
         self._last_frame_time = t
         # Update camera
         if self._current_move_dir != MoveDir.NONE:
             self._main_camera.move(self._current_move_dir, delta_time)
-            self._render_process_client.update_uniform(None, None, "uViewMat",
-                                                       self._main_camera.view_matrix)
+            self.__queue_view_matrix()
+        # The camera's fov, clip distances, or aspect ratio may have been changed since the last frame
+        self.__queue_projection_matrix()
+        self.__flush_uniforms()
         # Invoke callbacks
         self._on_frame_rendered(delta_time)
 
+    def __send_frame_to_stream_server(self, stream_data: Union[bytes, str]):
+        if isinstance(stream_data, str):
+            stream_data = stream_data.encode('utf-8')
+        self._canvas_stream_server.send(stream_data)  # type: ignore
+
+    def __send_frame_to_widget(self, stream_data: Union[bytes, str]):
+        if isinstance(stream_data, str):
+            self._widget.stream_data_ascii = stream_data  # type: ignore
+        else:
+            self._widget.stream_data_binary = stream_data  # type: ignore
+        # self._widget.send({"stream_data": len(stream_data)}, buffers=[stream_data])
+
     def __on_heartbeat(self):
-        self._render_process_client.send_heartbeat()
-        self._widget.status_connection = self._render_process_client.is_alive
+        is_alive = self._render_process_client.is_alive
+        if is_alive:
+            self._render_process_client.send_heartbeat()
+        if self._mouse_pos_dirty and not self._paused:
+            # Make sure the last position of a throttled mouse move still gets through
+            self.__flush_mouse_pos()
+        self.__flush_uniforms()
+        # Traitlets only syncs this to the frontend when the value actually changes
+        self._widget.status_connection = is_alive
         if self._canvas_stream_server is not None:
             self._canvas_stream_server.heartbeat()
 
@@ -234,24 +332,22 @@ class SSVCanvas:
     def __on_click(self, down: bool, button: int):
         if self._paused:
             return
+        if self._mouse_pos_dirty:
+            self.__flush_mouse_pos()
         self._mouse_down = (self._mouse_down[0] if button != 0 else down,
                             self._mouse_down[1] if button != 1 else down,
                             self._mouse_down[2] if button != 2 else down)
-        self._render_process_client.update_uniform(None, None, "uMouseDown", down)
+        with self._uniforms_lock:
+            self._pending_uniforms[(None, None, "uMouseDown")] = down
         self._main_camera.mouse_change(self._mouse_pos, self._mouse_down)
-        self._render_process_client.update_uniform(None, None, "uViewMat",
-                                                   self._main_camera.view_matrix)
+        self.__queue_view_matrix()
+        self.__flush_uniforms()
         self._on_mouse_event(self._mouse_down, self._mouse_pos, 0)
 
     def __update_camera_pos(self, key: str, down: bool):
-        if key == "ArrowUp" or key == "w" or key == "W" or key == "z" or key == "Z":
-            self._current_move_dir = MoveDir.FORWARD if down else MoveDir.NONE
-        elif key == "ArrowDown" or key == "s" or key == "S":
-            self._current_move_dir = MoveDir.BACKWARD if down else MoveDir.NONE
-        elif key == "ArrowLeft" or key == "a" or key == "A" or key == "q" or key == "Q":
-            self._current_move_dir = MoveDir.LEFT if down else MoveDir.NONE
-        elif key == "ArrowRight" or key == "d" or key == "D":
-            self._current_move_dir = MoveDir.RIGHT if down else MoveDir.NONE
+        move_dir = self._key_move_dirs.get(key)
+        if move_dir is not None:
+            self._current_move_dir = move_dir if down else MoveDir.NONE
 
     def __on_key(self, key: str, down: bool):
         if self._paused:
@@ -281,31 +377,71 @@ class SSVCanvas:
         if self._paused:
             return
         self._main_camera.zoom(value * 0.05)
-        self._render_process_client.update_uniform(None, None, "uViewMat",
-                                                   self._main_camera.view_matrix)
+        self.__queue_view_matrix()
+        self.__flush_uniforms()
         self._on_mouse_event(self._mouse_down, self._mouse_pos, value)
 
-    def __on_mouse_x_updated(self, x):
-        if self._paused:
+    def __on_mouse_pos_updated(self, change):
+        if self._paused or self._widget is None:
             return
-        self._mouse_pos = (x.new, self._mouse_pos[1])
-        self._render_process_client.update_uniform(None, None, "uMouse",
-                                                   tuple(self._mouse_pos))
-        self._main_camera.mouse_change(self._mouse_pos, self._mouse_down)
-        self._render_process_client.update_uniform(None, None, "uViewMat",
-                                                   self._main_camera.view_matrix)
-        self._on_mouse_event(self._mouse_down, self._mouse_pos, 0)
-
-    def __on_mouse_y_updated(self, y):
-        if self._paused:
+        # The widget usually syncs both axes in the same message, so by the time the first of the two observers fires
+        # both traits already hold their new values. Reading both here lets the second observer skip the update.
+        mouse_pos = (self._widget.mouse_pos_x, self._widget.mouse_pos_y)
+        if mouse_pos == self._mouse_pos:
             return
-        self._mouse_pos = (self._mouse_pos[0], y.new)
-        self._render_process_client.update_uniform(None, None, "uMouse",
-                                                   tuple(self._mouse_pos))
-        self._main_camera.mouse_change(self._mouse_pos, self._mouse_down)
-        self._render_process_client.update_uniform(None, None, "uViewMat",
-                                                   self._main_camera.view_matrix)
-        self._on_mouse_event(self._mouse_down, self._mouse_pos, 0)
+        self._mouse_pos = mouse_pos
+        # Pointer events can arrive much faster than we render, so only forward at most one move per frame. Any
+        # move which gets held back here is flushed by the next move, click, or heartbeat.
+        if time.monotonic() - self._mouse_flush_time < 1 / self._target_framerate:
+            self._mouse_pos_dirty = True
+            return
+        self.__flush_mouse_pos()
+
+    def __flush_mouse_pos(self):
+        mouse_pos = self._mouse_pos
+        self._mouse_pos_dirty = False
+        self._mouse_flush_time = time.monotonic()
+        with self._uniforms_lock:
+            self._pending_uniforms[(None, None, "uMouse")] = mouse_pos
+        self._main_camera.mouse_change(mouse_pos, self._mouse_down)
+        self.__queue_view_matrix()
+        self.__flush_uniforms()
+        self._on_mouse_event(self._mouse_down, mouse_pos, 0)
+
+    def __queue_view_matrix(self):
+        """
+        Queues an update of the ``uViewMat`` uniform, but only if the camera has actually moved since it was last sent.
+        """
+        view_matrix = self._main_camera.view_matrix
+        with self._uniforms_lock:
+            if self._last_view_matrix is not None and np.array_equal(view_matrix, self._last_view_matrix):
+                return
+            self._last_view_matrix = view_matrix.copy()
+            self._pending_uniforms[(None, None, "uViewMat")] = self._last_view_matrix
+
+    def __queue_projection_matrix(self):
+        """
+        Queues an update of the ``uProjMat`` uniform, but only if the camera's projection has changed since it was last
+        sent.
+        """
+        projection_matrix = self._main_camera.projection_matrix
+        with self._uniforms_lock:
+            if self._last_projection_matrix is not None and np.array_equal(projection_matrix,
+                                                                           self._last_projection_matrix):
+                return
+            self._last_projection_matrix = projection_matrix.copy()
+            self._pending_uniforms[(None, None, "uProjMat")] = self._last_projection_matrix
+
+    def __flush_uniforms(self):
+        """
+        Sends any pending uniform updates to the render process as a single batch.
+        """
+        with self._uniforms_lock:
+            if not self._pending_uniforms:
+                return
+            pending_uniforms, self._pending_uniforms = self._pending_uniforms, {}
+            # Sent while still holding the lock so that batches from different threads can't be reordered
+            self._render_process_client.update_uniforms([(*key, value) for key, value in pending_uniforms.items()])
 
     @property
     def main_render_buffer(self) -> SSVRenderBuffer:
@@ -375,7 +511,8 @@ class SSVCanvas:
         Sets the logger output to this SSVCanvas' widget if it exists.
         """
         if self._widget is not None:
-            set_output_stream(SSVRenderWidgetLogIO(self._widget))
+            self._log_stream = SSVRenderWidgetLogIO(self._widget)
+            set_output_stream(self._log_stream)
 
     def on_start(self, callback: Callable[[], None], remove: bool = False):
         """
@@ -415,7 +552,7 @@ class SSVCanvas:
         self._on_frame_rendered.register_callback(callback, remove)
 
     def run(self, stream_mode: Union[str, SSVStreamingMode] = SSVStreamingMode.JPG,
-            stream_quality: Optional[float] = None, never_kill=False) -> None:
+            stream_quality: Optional[float] = None, never_kill=False, adaptive_quality=False) -> None:
         """
         Starts the render loop and displays the Jupyter Widget (or render window if in standalone mode).
 
@@ -429,6 +566,9 @@ class SSVCanvas:
         :param never_kill: disables the watchdog responsible for stopping the render process when the widget is no
                            longer being displayed. *Warning*: The only way to stop a renderer started with this enabled
                            is to restart the Jupyter kernel.
+        :param adaptive_quality: lowers the encoding quality while the render process can't encode frames fast enough
+                                 to keep up with the target framerate, raising it back towards ``stream_quality`` when
+                                 it catches up. Only supported by the ``jpg`` streaming mode.
         """
         if isinstance(stream_mode, str):
             try:
@@ -439,7 +579,8 @@ class SSVCanvas:
         self._streaming_mode = stream_mode
         self._last_run_settings = {"stream_mode": stream_mode,
                                    "stream_quality": stream_quality,
-                                   "never_kill": never_kill}
+                                   "never_kill": never_kill,
+                                   "adaptive_quality": adaptive_quality}
         self._paused = False
 
         if not self._render_process_client.is_alive:
@@ -459,26 +600,34 @@ class SSVCanvas:
                 self._canvas_stream_server = SSVCanvasStreamServer(http=True)
                 self._widget.use_websockets = False
                 self._widget.websocket_url = self._canvas_stream_server.url
+                self._frame_sink = self._canvas_stream_server.send  # type: ignore
             elif self._supports_websockets:
-                self._canvas_stream_server = SSVCanvasStreamServer()
+                # Only whole images can be skipped when the client falls behind, video packets depend on each other
+                self._canvas_stream_server = SSVCanvasStreamServer(drop_frames=self._streaming_mode in (
+                    SSVStreamingMode.JPG, SSVStreamingMode.PNG, SSVStreamingMode.WEBP))
                 self._widget.websocket_url = self._canvas_stream_server.url
+                self._frame_sink = self.__send_frame_to_stream_server
+            else:
+                self._frame_sink = self.__send_frame_to_widget
             display(self._widget)
-            self._widget.observe(lambda x: self.__on_mouse_x_updated(x), names=["mouse_pos_x"])
-            self._widget.observe(lambda y: self.__on_mouse_y_updated(y), names=["mouse_pos_y"])
-            if self._update_frame_rate_task is None or self._update_frame_rate_task.is_alive():
+            self._frame_rate_task_stop.clear()
+            if self._update_frame_rate_task is None or not self._update_frame_rate_task.is_alive():
                 self._update_frame_rate_task = Thread(name=f"SSV Canvas Frame Rate Updater - {id(self):#08x}",
                                                       daemon=True, target=self.__update_frame_rate_task)
                 self._update_frame_rate_task.start()
 
         # Make sure the view and projection matrices are defined before rendering
-        self._render_process_client.update_uniform(None, None, "uViewMat",
-                                                   self._main_camera.view_matrix)
-        self._render_process_client.update_uniform(None, None, "uProjMat",
-                                                   self._main_camera.projection_matrix)
+        with self._uniforms_lock:
+            self._last_view_matrix = None
+            self._last_projection_matrix = None
+        self.__queue_view_matrix()
+        self.__queue_projection_matrix()
+        self.__flush_uniforms()
 
         self._render_process_client.set_timeout(None if never_kill else self._render_timeout)
         self.canvas_time = 0
-        self._render_process_client.render(self._target_framerate, self._streaming_mode.value, stream_quality)
+        self._render_process_client.render(self._target_framerate, self._streaming_mode.value, stream_quality,
+                                           adaptive_quality)
 
     def stop(self, force=False) -> None:
         """
@@ -489,7 +638,11 @@ class SSVCanvas:
         """
         self._paused = True
         self._pause_time = 0.0
+        if self._log_stream is not None:
+            # Don't leave the last log messages waiting in the widget's log buffer
+            self._log_stream.send_pending()
         if force:
+            self._frame_rate_task_stop.set()
             self._render_process_client.stop()
         else:
             self._render_process_client.render(0, self._streaming_mode.value)
@@ -510,7 +663,8 @@ class SSVCanvas:
             if "stream_quality" in self._last_run_settings:
                 self.canvas_time = self._pause_time
                 self._render_process_client.render(self._target_framerate, self._streaming_mode.value,
-                                                   self._last_run_settings["stream_quality"])
+                                                   self._last_run_settings["stream_quality"],
+                                                   self._last_run_settings["adaptive_quality"])
 
     def shader(self, shader_source: str, additional_template_directory: Optional[str] = None,
                additional_templates: Optional[List[str]] = None,
@@ -567,7 +721,7 @@ class SSVCanvas:
         return SSVRenderBuffer(self, self._render_process_client, self._preprocessor, None,
                                render_buffer_name, order, size, dtype, components)
 
-    def texture(self, data: Union[npt.NDArray, Image.Image], uniform_name: Optional[str], force_2d: bool = False,
+    def texture(self, data: Union[npt.NDArray, "Image.Image"], uniform_name: Optional[str], force_2d: bool = False,
                 force_3d: bool = False, override_dtype: Optional[str] = None, treat_as_normalized_integer: bool = True,
                 declare_uniform: bool = True) -> SSVTexture:
         """
@@ -593,7 +747,12 @@ class SSVCanvas:
                                             https://www.khronos.org/opengl/wiki/Normalized_Integer for more details.
         :param declare_uniform: when set, a shader uniform is automatically declared for this uniform in shaders.
         """
-        uniform_name = uniform_name if uniform_name is not None else f"uTexture{len(self._textures)}"
+        if uniform_name is None:
+            # Skip over any names which have already been taken by textures which were explicitly named
+            while f"uTexture{self._texture_counter}" in self._textures:
+                self._texture_counter += 1
+            uniform_name = f"uTexture{self._texture_counter}"
+            self._texture_counter += 1
         if uniform_name in self._textures:
             if self._textures[uniform_name] is not None and self._textures[uniform_name].is_valid:
                 raise ValueError(f"A texture with the name '{uniform_name}' is already defined on this canvas. Call "
@@ -700,18 +859,12 @@ class SSVCanvas:
         if "primitive_type" in shaders and shaders["primitive_type"] is None:
             del shaders["primitive_type"]
 
-        stages = list(shaders.keys())
-        shaders_vals = list(shaders.values())
-        stages = [f"////////////////////////////////////////\n"
-                  f"// {stage.upper():^34} //\n"
-                  f"////////////////////////////////////////\n\n" for stage in stages]
-        shaders_vals = [f"{shader}\n\n\n" for shader in shaders_vals]
-        preproc_src = f"/************************************************************\n" \
-                      f" * {f'pySSV Shader Preprocessor version: {__version__}':^56} *\n" \
-                      f" ************************************************************/\n\n"
-        preproc_src += "".join([str(s) for shader in zip(stages, shaders_vals) for s in shader])
-
-        return preproc_src
+        parts = [_DBG_PREPROCESSOR_BANNER.format(f"pySSV Shader Preprocessor version: {__version__}")]
+        for stage, shader in shaders.items():
+            parts.append(_DBG_STAGE_BANNER.format(stage.upper()))
+            parts.append(f"{shader}\n\n\n")
+
+        return "".join(parts)
 
     def dbg_render_test(self):
         """
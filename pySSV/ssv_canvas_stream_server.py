@@ -5,18 +5,38 @@ import time
 import portpicker  # type: ignore
 from websockets.sync.server import serve, ServerConnection, WebSocketServer
 from websockets import ConnectionClosed
-from threading import Thread, ThreadError, current_thread
-from typing import Optional, Union, Callable
-from queue import SimpleQueue, Empty
+from threading import Thread, ThreadError, Lock, current_thread
+from typing import Optional, Union, Callable, Set
+from queue import Queue, Empty, Full
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from functools import partial
 
 from .ssv_logging import log
 
 
+def _get_latest_frame(msg_queue: "Queue[bytes]", timeout: float) -> bytes:
+    """
+    Waits for a frame to be put in the queue and then takes the newest frame from it, discarding any older ones; stale
+    frames aren't worth spending bandwidth on when streaming live renders.
+
+    :param msg_queue: the queue to take frames from.
+    :param timeout: how long to wait for a frame in seconds.
+    :return: the newest frame in the queue.
+    :raises Empty: if no frame arrived before the timeout elapsed.
+    """
+    msg = msg_queue.get(block=True, timeout=timeout)
+    while True:
+        try:
+            msg = msg_queue.get_nowait()
+        except Empty:
+            return msg
+
+
 class SSVCanvasStreamServerHTTP(BaseHTTPRequestHandler):
-    def __init__(self, msg_queue: SimpleQueue, is_alive: Callable[[], bool], *args, **kwargs):
-        self._msg_queue = msg_queue
+    def __init__(self, open_msg_queue: Callable[[], "Queue[bytes]"], close_msg_queue: Callable[["Queue[bytes]"], None],
+                 is_alive: Callable[[], bool], *args, **kwargs):
+        self._open_msg_queue = open_msg_queue
+        self._close_msg_queue = close_msg_queue
         self._is_alive = is_alive
         super().__init__(*args, **kwargs)
 
@@ -30,21 +50,25 @@ class SSVCanvasStreamServerHTTP(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(f"\r\n--{boundary}\r\n".encode("utf-8"))
         timestamp = 0
-        while True or self._is_alive():
-            try:
-                msg = self._msg_queue.get(block=True, timeout=1)
-            except Empty:
-                continue
-            try:
-                self.wfile.write(f"Content-Type: image/jpeg\r\n"
-                                 f"Content-Length: {len(msg)}\r\n"
-                                 f"X-Timestamp: {timestamp}.0000\r\n"
-                                 f"\r\n".encode("utf-8"))
-                self.wfile.write(msg)
-                self.wfile.write(f"\r\n--{boundary}\r\n".encode("utf-8"))
-                timestamp += 1
-            except ConnectionError:
-                return
+        msg_queue = self._open_msg_queue()
+        try:
+            while True or self._is_alive():
+                try:
+                    msg = _get_latest_frame(msg_queue, 1)
+                except Empty:
+                    continue
+                try:
+                    self.wfile.write(f"Content-Type: image/jpeg\r\n"
+                                     f"Content-Length: {len(msg)}\r\n"
+                                     f"X-Timestamp: {timestamp}.0000\r\n"
+                                     f"\r\n".encode("utf-8"))
+                    self.wfile.write(msg)
+                    self.wfile.write(f"\r\n--{boundary}\r\n".encode("utf-8"))
+                    timestamp += 1
+                except ConnectionError:
+                    return
+        finally:
+            self._close_msg_queue(msg_queue)
 
 
 class SSVCanvasStreamServer:
@@ -52,12 +76,31 @@ class SSVCanvasStreamServer:
     A basic websocket/http server which serves frame data to the SSV canvas.
     """
 
-    def __init__(self, http: bool = False, port: Optional[int] = None, timeout: float = 10):
+    # How many frames can be waiting to be sent to each client before the oldest ones start being dropped
+    _max_queued_frames = 4
+    # For streams which can't drop frames: how many packets can be waiting to be sent to each client before it's
+    # disconnected (about half a second of video at 60 fps)
+    _max_queued_packets = 30
+
+    def __init__(self, http: bool = False, port: Optional[int] = None, timeout: float = 10, drop_frames: bool = True):
+        """
+        Creates and starts a new stream server.
+
+        :param http: whether to serve frames as an MJPEG stream over HTTP instead of over a websocket.
+        :param port: the port to listen on; an unused port is picked if this is ``None``.
+        :param timeout: how long in seconds the server stays alive without receiving a heartbeat.
+        :param drop_frames: whether stale frames can be dropped when a client falls behind. This must be disabled for
+                            video codecs where each packet depends on the ones before it.
+        """
         self._port = port if port is not None else portpicker.pick_unused_port()
         self._hostname = "localhost"
         self._http = http
+        self._drop_frames = drop_frames
         self._server: Optional[Union[HTTPServer, WebSocketServer]] = None
-        self._msg_queue: SimpleQueue[bytes] = SimpleQueue()
+        # Each connected client gets its own queue of frames so that a slow client can't hold back the others
+        self._msg_queues: Set[Queue[bytes]] = set()
+        self._msg_queues_lock = Lock()
+        self._dropped_frame_warn_time = 0.
         self._is_alive = True
         self._heartbeat_time = time.monotonic()
         self._timeout = timeout
@@ -98,7 +141,8 @@ class SSVCanvasStreamServer:
         """
         # log(f"Starting streaming server on ws://{self._hostname}:{self._port}/...", severity=logging.INFO)
         if self._http:
-            handler = partial(SSVCanvasStreamServerHTTP, self._msg_queue, lambda: self.is_alive)
+            handler = partial(SSVCanvasStreamServerHTTP, self._open_msg_queue, self._close_msg_queue,
+                              lambda: self.is_alive)
             with HTTPServer((self._hostname, self._port), handler) as server:
                 self._server = server
                 self._server.serve_forever()
@@ -116,21 +160,52 @@ class SSVCanvasStreamServer:
         :param connection: the websocket connection object.
         """
         # log(f"Canvas connected to streaming server.", severity=logging.INFO)
-        # Empty the queue as soon as the connection is established; the client doesn't want any potentially old frames.
-        for i in range(self._msg_queue.qsize()):
-            self._msg_queue.get_nowait()
+        # The new connection's queue starts empty; the client doesn't want any potentially old frames.
+        msg_queue = self._open_msg_queue()
         self._is_alive = True
-        while self.is_alive:
-            try:
-                msg = self._msg_queue.get(block=True, timeout=1)
-            except Empty:
-                continue
-            try:
-                connection.send(msg)
-            except ConnectionClosed:
-                self._is_alive = False
-                # log(f"Remote websocket connection closed.", severity=logging.INFO)
-                return
+        try:
+            while self.is_alive:
+                try:
+                    # Video packets depend on each other so they all have to be sent, only images can be skipped
+                    msg = _get_latest_frame(msg_queue, 1) if self._drop_frames else msg_queue.get(block=True, timeout=1)
+                except Empty:
+                    if self.__is_dropped(msg_queue):
+                        connection.close()
+                        return
+                    continue
+                try:
+                    connection.send(msg)
+                except ConnectionClosed:
+                    self._is_alive = False
+                    # log(f"Remote websocket connection closed.", severity=logging.INFO)
+                    return
+        finally:
+            self._close_msg_queue(msg_queue)
+
+    def _open_msg_queue(self) -> "Queue[bytes]":
+        """
+        Creates a new frame queue for a client which has just connected.
+
+        :return: the queue which frames for this client will be put in.
+        """
+        msg_queue: Queue[bytes] = Queue(maxsize=self._max_queued_frames if self._drop_frames
+                                        else self._max_queued_packets)
+        with self._msg_queues_lock:
+            self._msg_queues.add(msg_queue)
+        return msg_queue
+
+    def _close_msg_queue(self, msg_queue: "Queue[bytes]"):
+        """
+        Stops sending frames to a client's queue once it has disconnected.
+
+        :param msg_queue: the queue to remove.
+        """
+        with self._msg_queues_lock:
+            self._msg_queues.discard(msg_queue)
+
+    def __is_dropped(self, msg_queue: "Queue[bytes]") -> bool:
+        with self._msg_queues_lock:
+            return msg_queue not in self._msg_queues
 
     def close(self):
         """
@@ -148,15 +223,41 @@ class SSVCanvasStreamServer:
 
         :param msg: the packet to send.
         """
-        if self._is_alive:
-            if self._msg_queue.qsize() > 10:
-                log("Streaming server is more than 10 frames behind! Consider reducing bandwidth by increasing "
-                    "the stream compression.", severity=logging.WARN)
-                # Try and catch up by skipping frames
-                for i in range(self._msg_queue.qsize()-1):
-                    self._msg_queue.get_nowait()
-                return
-            self._msg_queue.put_nowait(msg)
+        if not self._is_alive:
+            return
+        with self._msg_queues_lock:
+            msg_queues = tuple(self._msg_queues)
+        for msg_queue in msg_queues:
+            if not self._drop_frames:
+                # Video packets can't be skipped without corrupting the stream until the next keyframe, and we can't
+                # block the caller (the render process client's thread) either. So stop feeding a client which has
+                # fallen too far behind; its connection is closed once it's sent what's already queued.
+                try:
+                    msg_queue.put_nowait(msg)
+                except Full:
+                    self._close_msg_queue(msg_queue)
+                    log(f"Streaming client is more than {self._max_queued_packets} packets behind, disconnecting it! "
+                        f"Consider reducing bandwidth by increasing the stream compression.", severity=logging.WARN)
+                continue
+            # Never block the caller on a slow client; if it's fallen behind then drop its oldest frame since only the
+            # latest one is worth showing.
+            while True:
+                try:
+                    msg_queue.put_nowait(msg)
+                    break
+                except Full:
+                    try:
+                        msg_queue.get_nowait()
+                    except Empty:
+                        pass
+                    self.__warn_dropped_frame()
+
+    def __warn_dropped_frame(self):
+        t = time.monotonic()
+        if t - self._dropped_frame_warn_time > 5:
+            self._dropped_frame_warn_time = t
+            log(f"Streaming server is more than {self._max_queued_frames} frames behind! Consider reducing bandwidth "
+                f"by increasing the stream compression.", severity=logging.WARN)
 
     def heartbeat(self):
         """
@@ -886,9 +886,8 @@ class SSVGUI:
             if shadow:
                 render_mode |= SSVGUIShaderMode.SHADOWED
 
-            # TODO: The camera view/projection matrix should be cached to avoid calculating it so often...
             # pos_clip = gui.canvas.main_camera.projection_matrix @ gui.canvas.main_camera.view_matrix @ (*pos, 1.)
-            pos_clip = (*pos, 1.) @ gui.canvas.main_camera.view_matrix @ gui.canvas.main_camera.projection_matrix
+            pos_clip = (*pos, 1.) @ gui.canvas.main_camera.view_projection_matrix
             pos_clip[0] /= pos_clip[2]
             pos_clip[1] /= pos_clip[2]
             # Clipping planes
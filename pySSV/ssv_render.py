@@ -25,6 +25,7 @@ class SSVStreamingMode(Enum):
     """
     JPG = "jpg"
     PNG = "png"
+    WEBP = "webp"
 
     VP8 = "vp8"
     VP9 = "vp9"
@@ -37,6 +38,13 @@ class SSVStreamingMode(Enum):
     MJPEG = "mjpeg"
 
 
+class SSVBackend(Enum):
+    """
+    Represents a rendering backend for pySSV.
+    """
+    OPENGL = "opengl"
+
+
 class SSVRender(ABC):
     """
     An abstract rendering backend for SSV
@@ -83,6 +91,35 @@ class SSVRender(ABC):
         """
         ...
 
+    @abstractmethod
+    def read_frame_into_async(self, buffer: bytearray, components: int = 4, frame_buffer_uid: int = 0) -> None:
+        """
+        Starts an asynchronous read back of the current contents of the frame buffer and copies the *previously*
+        read frame into the given buffer. This avoids stalling the pipeline while the GPU finishes rendering, at the
+        cost of a frame of latency. If no previous frame with the same size and format is available, the current
+        frame is read synchronously instead.
+
+        :param buffer: the buffer to copy the frame into.
+        :param components: how many components to read from the frame (out of ``RGBA``).
+        :param frame_buffer_uid: the frame buffer to read from.
+        """
+        ...
+
+    @abstractmethod
+    def read_pending_frame_into(self, buffer: bytearray, components: int = 4, frame_buffer_uid: int = 0) -> bool:
+        """
+        Copies the frame still waiting in the asynchronous read back started by ``read_frame_into_async()`` into the
+        given buffer. This should be called when rendering stops so that the last rendered frame isn't lost. Afterwards,
+        the next call to ``read_frame_into_async()`` reads its frame synchronously, rather than returning one which was
+        rendered before rendering stopped.
+
+        :param buffer: the buffer to copy the frame into.
+        :param components: how many components to read from the frame (out of ``RGBA``).
+        :param frame_buffer_uid: the frame buffer to read from.
+        :return: whether there was a pending frame with the same size and format to copy.
+        """
+        ...
+
     @abstractmethod
     def log_context_info(self, full=False) -> None:
         """
@@ -11,22 +11,11 @@ import moderngl
 import numpy as np
 import numpy.typing as npt
 
-from .environment import ENVIRONMENT, Env
+from .environment import get_env, Env
 from .ssv_logging import log
 from .ssv_render import SSVRender
 from .ssv_texture import determine_texture_shape
 
-# Optional support for pyRenderdocApp
-try:
-    from pyRenderdocApp import load_render_doc, RENDERDOC_API_1_6_0  # type: ignore
-except ImportError:
-    class RENDERDOC_API_1_6_0:  # type: ignore[no-redef]
-        ...
-
-
-    def load_render_doc(renderdoc_path: Optional[str] = None) -> RENDERDOC_API_1_6_0:  # type: ignore[no-redef]
-        return RENDERDOC_API_1_6_0()
-
 PRIMITIVE_TYPES: Dict[str, int] = {
     "POINTS": cast(int, moderngl.POINTS),
     "LINES": cast(int, moderngl.LINES),
@@ -139,10 +128,20 @@ class SSVRenderOpenGL(SSVRender):
         self._renderdoc_api = None
         self._renderdoc_is_capturing = False
         if use_renderdoc_api:
-            self._renderdoc_api = load_render_doc()
+            # Optional support for pyRenderdocApp, only imported when it's actually used since it loads a native library
+            try:
+                from pyRenderdocApp import load_render_doc  # type: ignore
+                self._renderdoc_api = load_render_doc()
+            except ImportError:
+                log("Couldn't find pyRenderdocApp module! Renderdoc will not be loaded.", severity=logging.WARN)
         self.__create_context(gl_version)
         self._start_time = time.time()
         self._frame_no = 0
+        # A pair of pixel pack buffers used to read back frames asynchronously, alternating each frame
+        self._pack_buffers: List[Optional[moderngl.Buffer]] = [None, None]
+        self._pack_buffer_index = 0
+        # The frame buffer, components, and size of the frame in the last written pack buffer
+        self._pack_buffer_format: Optional[Tuple[int, int, Tuple[int, int]]] = None
 
         # Create a default output framebuffer
         self.update_frame_buffer(0, 999999, (640, 480), "main_render_buffer")
@@ -165,7 +164,7 @@ class SSVRenderOpenGL(SSVRender):
                 os.environ["MESA_D3D12_DEFAULT_ADAPTER_NAME"] = "NVIDIA"
 
         # TODO: Come up with a more legible way of creating the context... This is a mess...
-        if ENVIRONMENT == Env.COLAB:
+        if get_env() == Env.COLAB:
             # TODO: Test if any other platforms require specific backends
             # In Google Colab we need to explicitly specify the EGL backend, otherwise it tries (and fails) to use X11
             # noinspection PyTypeChecker
@@ -624,6 +623,44 @@ class SSVRenderOpenGL(SSVRender):
     def read_frame_into(self, buffer, components: int = 4, frame_buffer_uid: int = 0):
         self._render_buffers[frame_buffer_uid].frame_buffer.read_into(buffer, components=components)
 
+    def read_frame_into_async(self, buffer, components: int = 4, frame_buffer_uid: int = 0):
+        frame_buffer = self._render_buffers[frame_buffer_uid].frame_buffer
+        frame_format = (frame_buffer_uid, components, frame_buffer.size)
+        n_bytes = frame_buffer.width * frame_buffer.height * components
+
+        index = self._pack_buffer_index
+        pack_buffer = self._pack_buffers[index]
+        if pack_buffer is None or pack_buffer.size < n_bytes:
+            if pack_buffer is not None and self.ctx.gc_mode is None:
+                pack_buffer.release()
+            pack_buffer = self.ctx.buffer(reserve=n_bytes, dynamic=True)
+            self._pack_buffers[index] = pack_buffer
+
+        # Queue a copy of the current frame into a pack buffer, this returns without waiting for the GPU
+        frame_buffer.read_into(pack_buffer, components=components)
+
+        prev_pack_buffer = self._pack_buffers[1 - index]
+        if prev_pack_buffer is not None and self._pack_buffer_format == frame_format:
+            # The previous frame should have finished copying by now
+            prev_pack_buffer.read_into(buffer, size=n_bytes)
+        else:
+            # There's no previous frame to return, so wait for this one
+            pack_buffer.read_into(buffer, size=n_bytes)
+
+        self._pack_buffer_format = frame_format
+        self._pack_buffer_index = 1 - index
+
+    def read_pending_frame_into(self, buffer, components: int = 4, frame_buffer_uid: int = 0) -> bool:
+        frame_buffer = self._render_buffers[frame_buffer_uid].frame_buffer
+        frame_format = (frame_buffer_uid, components, frame_buffer.size)
+        # The most recently written pack buffer is the one before the current index
+        pack_buffer = self._pack_buffers[1 - self._pack_buffer_index]
+        has_pending_frame = pack_buffer is not None and self._pack_buffer_format == frame_format
+        if pack_buffer is not None and has_pending_frame:
+            pack_buffer.read_into(buffer, size=frame_buffer.width * frame_buffer.height * components)
+        self._pack_buffer_format = None
+        return has_pending_frame
+
     def renderdoc_capture_frame(self, filename: Optional[str]):
         if self._renderdoc_api is not None:
             self._renderdoc_api.set_capture_file_path_template(filename)
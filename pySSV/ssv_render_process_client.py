@@ -1,10 +1,12 @@
 #  Copyright (c) 2023-2024 Thomas Mathieson.
 #  Distributed under the terms of the MIT license.
 import logging
-from multiprocessing import Process, Queue, set_start_method
+import os
+import weakref
+from multiprocessing import Process, Queue, set_start_method, shared_memory, resource_tracker
 from queue import Empty
 from threading import Thread, Lock
-from typing import Callable, Optional, Any, Union, Set, Tuple, Dict, List
+from typing import Callable, Optional, Any, Union, Set, Tuple, Dict, List, Iterable, cast
 import sys
 if sys.version_info >= (3, 10):
     from typing import TypeAlias
@@ -19,10 +21,10 @@ from .ssv_future import Future
 from .ssv_logging import log
 from .ssv_render import SSVStreamingMode
 from .ssv_render_process_server import SSVRenderProcessServer
-from .environment import ENVIRONMENT, Env
+from .environment import get_env, Env
 
 
-OnRenderObserverDelegate: TypeAlias = Callable[[bytes], None]
+OnRenderObserverDelegate: TypeAlias = Callable[[Optional[bytes]], None]
 OnLogObserverDelegate: TypeAlias = Callable[[str], None]
 
 
@@ -47,19 +49,28 @@ class SSVRenderProcessClient:
         self._query_futures: Dict[int, Future] = dict()
         self._query_future_id_counter = 0
         self._query_futures_lock = Lock()
+        # The render process's shared memory frame slots that we're attached to, indexed by slot
+        self._frame_slots: Dict[int, shared_memory.SharedMemory] = {}
         self._rx_thread = Thread(target=self.__rx_thread_process, daemon=True,
                                  name=f"SSV Render Process Client RX Thread - {id(self):#08x}")
         self._rx_thread.start()
-        self._on_render_observers: List[OnRenderObserverDelegate] = []
+        # Bound methods are held weakly so that subscribing doesn't keep the subscriber alive
+        self._on_render_observers: List[Callable[[], Optional[OnRenderObserverDelegate]]] = []
         self._on_log_observers: List[OnLogObserverDelegate] = []
 
         # Set the multiprocessing start method
-        if ENVIRONMENT != Env.COLAB:
+        if get_env() != Env.COLAB:
             try:
                 set_start_method("spawn")
             except RuntimeError:
                 pass
 
+        if os.name == "posix":
+            # Make sure the render process shares our resource tracker (forked processes only inherit it if it's
+            # already running), so that there's only one record of the shared memory frame slots it creates. This way
+            # the tracker can still clean them up if the render process is killed.
+            resource_tracker.ensure_running()
+
         # Construct the render process server in its own process, passing it the backend string and the command queues
         # (note that the rx and tx queues are flipped here, the rx queue of the server is the tx queue of the client)
         self._render_process = Process(target=SSVRenderProcessServer, daemon=True,
@@ -71,7 +82,16 @@ class SSVRenderProcessClient:
 
     def __del__(self):
         self._render_process.kill()
+        self._render_process.join()
         self._render_process.close()
+        for frame_slot in self._frame_slots.values():
+            frame_slot.close()
+            # The render process normally unlinks its frame slots when it shuts down, but it won't have had the chance
+            # if it was just killed.
+            try:
+                frame_slot.unlink()
+            except FileNotFoundError:
+                pass
 
     def __rx_thread_process(self):
         while True:
@@ -83,8 +103,14 @@ class SSVRenderProcessClient:
 
             if command == "NFrm":
                 # New frame data is available
-                for observer in self._on_render_observers:
-                    observer(command_args[0])
+                self.__dispatch_on_render(command_args[0])
+            elif command == "NFrS":
+                # New frame data is available in a shared memory slot
+                frame = self.__read_frame_slot(*command_args)
+                # Let the render process reuse the slot
+                self._command_queue_tx.put(("FrRl", command_args[0]))
+                if frame is not None:
+                    self.__dispatch_on_render(frame)
             elif command == "LogM":
                 # Log message
                 for observer in self._on_log_observers:
@@ -105,6 +131,35 @@ class SSVRenderProcessClient:
                 log(f"Received unknown command from render process '{command}' with args: {command_args}!",
                     severity=logging.ERROR)
 
+    def __read_frame_slot(self, slot: int, name: str, n_bytes: int) -> Optional[bytes]:
+        """
+        Copies a frame out of one of the render process's shared memory frame slots.
+
+        :param slot: the index of the frame slot.
+        :param name: the name of the shared memory block backing the slot.
+        :param n_bytes: the length of the frame in bytes.
+        :return: the frame data or ``None`` if the slot couldn't be opened.
+        """
+        frame_slot = self._frame_slots.get(slot)
+        if frame_slot is None or frame_slot.name != name:
+            # The render process reallocates slots when frames outgrow them
+            if frame_slot is not None:
+                frame_slot.close()
+            try:
+                # The render process owns the slot and unlinks it when it's done with it. It shares our resource
+                # tracker, which already knows about the slot, so there's no need to register it again.
+                if sys.version_info >= (3, 13):
+                    frame_slot = shared_memory.SharedMemory(name=name, track=False)
+                else:
+                    frame_slot = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                log(f"Couldn't open frame slot '{name}', dropping frame.", severity=logging.WARN)
+                self._frame_slots.pop(slot, None)
+                return None
+            self._frame_slots[slot] = frame_slot
+
+        return bytes(cast(memoryview, frame_slot.buf)[:n_bytes])
+
     def __create_async_query(self, command: str, *args) -> Future[Any]:
         """
         Runs a command which returns an async result and waits for its result to be returned.
@@ -127,13 +182,37 @@ class SSVRenderProcessClient:
     def is_alive(self):
         return self._is_alive and self._render_process.is_alive()
 
+    def __dispatch_on_render(self, frame: Optional[bytes]):
+        for observer_ref in list(self._on_render_observers):
+            observer = observer_ref()
+            if observer is None:
+                # The subscriber has been garbage collected
+                try:
+                    self._on_render_observers.remove(observer_ref)
+                except ValueError:
+                    pass
+                continue
+            observer(frame)
+
     def subscribe_on_render(self, observer: OnRenderObserverDelegate):
         """
         Subscribes an event handler to the on_render event, triggered after each frame is rendered.
 
-        :param observer: a function to handle the event (must have the signature: `callback(data: bytes) -> None`).
+        Bound methods are only weakly referenced, they are unsubscribed automatically when their object is garbage
+        collected. Subscribing an event handler which is already subscribed has no effect.
+
+        :param observer: a function to handle the event (must have the signature:
+                         `callback(data: Optional[bytes]) -> None`). ``data`` is ``None`` when the frame is identical
+                         to the last one sent.
         """
-        self._on_render_observers.append(observer)
+        if any(observer_ref() == observer for observer_ref in self._on_render_observers):
+            return
+        observer_ref: Callable[[], Optional[OnRenderObserverDelegate]]
+        if hasattr(observer, "__self__") and hasattr(observer, "__func__"):
+            observer_ref = weakref.WeakMethod(observer)  # type: ignore
+        else:
+            observer_ref = (lambda: observer)
+        self._on_render_observers.append(observer_ref)
 
     def unsubscribe_on_render(self, observer: OnRenderObserverDelegate):
         """
@@ -141,7 +220,11 @@ class SSVRenderProcessClient:
 
         :param observer: a function currently registered to handle the event.
         """
-        self._on_render_observers.remove(observer)
+        for observer_ref in self._on_render_observers:
+            if observer_ref() == observer:
+                self._on_render_observers.remove(observer_ref)
+                return
+        raise ValueError(f"{observer} is not subscribed to the on_render event!")
 
     def subscribe_on_log(self, observer: OnLogObserverDelegate):
         """
@@ -186,7 +269,8 @@ class SSVRenderProcessClient:
         """
         self._command_queue_tx.put(("DFBO", buffer_uid))
 
-    def render(self, target_framerate: float, stream_mode: str, encode_quality: Optional[float] = None):
+    def render(self, target_framerate: float, stream_mode: str, encode_quality: Optional[float] = None,
+               adaptive_quality: bool = False):
         """
         Starts rendering frames at the given framerate.
 
@@ -197,8 +281,11 @@ class SSVRenderProcessClient:
                                results in the highest quality. This value is scaled to give a bit rate target or
                                quality factor for the chosen encoder. Pass in ``None`` to use the encoder's default
                                quality settings.
+        :param adaptive_quality: whether the render process should lower the encoding quality when it can't encode
+                                 frames fast enough to keep up with the target framerate. The quality is never raised
+                                 above ``encode_quality``. Only supported by the ``jpg`` streaming mode.
         """
-        self._command_queue_tx.put(("Rndr", target_framerate, stream_mode, encode_quality))
+        self._command_queue_tx.put(("Rndr", target_framerate, stream_mode, encode_quality, adaptive_quality))
 
     def stop(self):
         """
@@ -234,10 +321,25 @@ class SSVRenderProcessClient:
         :param value: the new value of the shader uniform. (Must be convertible to a GLSL type)
         """
         if isinstance(value, np.ndarray):
-            if len(value.shape) > 1:
-                value = value.flatten()
+            # A flat tuple of python scalars is much cheaper to pickle than an array and is accepted by the renderer
+            value = tuple(value.ravel().tolist())
         self._command_queue_tx.put(("UpdU", frame_buffer_uid, draw_call_uid, uniform_name, value))
 
+    def update_uniforms(self, uniforms: Iterable[Tuple[Optional[int], Optional[int], str, Any]]):
+        """
+        Updates the values of several shader uniforms at once. This is sent to the render process as a single command,
+        which is cheaper than calling :meth:`update_uniform` for each uniform.
+
+        :param uniforms: an iterable of ``(frame_buffer_uid, draw_call_uid, uniform_name, value)`` tuples, see
+                         :meth:`update_uniform` for the meaning of each element.
+        """
+        batch = []
+        for frame_buffer_uid, draw_call_uid, uniform_name, value in uniforms:
+            if isinstance(value, np.ndarray):
+                value = tuple(value.ravel().tolist())
+            batch.append((frame_buffer_uid, draw_call_uid, uniform_name, value))
+        self._command_queue_tx.put(("UpdB", batch))
+
     def update_vertex_buffer(self, frame_buffer_uid: int, draw_call_uid: int,
                              vertex_array: Optional[npt.NDArray], index_array: Optional[npt.NDArray],
                              vertex_attributes: Optional[Tuple[str, ...]]):
@@ -1,25 +1,35 @@
 #  Copyright (c) 2023-2024 Thomas Mathieson.
 #  Distributed under the terms of the MIT license.
-import base64
 import io
 import logging
 import time
 from io import BytesIO
-from multiprocessing import Queue, current_process
-from queue import Empty
-from threading import current_thread
-from typing import Optional, Dict, Set, Tuple
+from multiprocessing import Queue, current_process, shared_memory
+from queue import Empty, Full, Queue as FrameQueue
+from threading import current_thread, Thread, Lock
+from typing import Optional, Dict, Set, Tuple, List, cast
 
 import av  # type: ignore
 import numpy as np
 import numpy.typing as npt
-from PIL import Image
 
 from . import ssv_logging
 from .ssv_logging import log, SSVLogStream
-from .ssv_render import SSVRender, SSVStreamingMode
+from .ssv_render import SSVRender, SSVStreamingMode, SSVBackend
 from .ssv_render_opengl import SSVRenderOpenGL
 
+# Optional support for pybase64, a SIMD accelerated drop-in replacement for the base64 module
+try:
+    import pybase64 as base64  # type: ignore
+except ImportError:
+    import base64  # type: ignore[no-redef]
+
+# Optional support for simplejpeg (libjpeg-turbo), which encodes jpeg frames faster than PIL
+try:
+    import simplejpeg  # type: ignore
+except ImportError:
+    simplejpeg = None
+
 
 class SSVRenderProcessLogger(SSVLogStream):
     """
@@ -56,13 +66,37 @@ class SSVRenderProcessServer:
         self.stream_mode: SSVStreamingMode = SSVStreamingMode.PNG
         self.watchdog_time = timeout
         self.encode_quality: Optional[float] = None
+        self.adaptive_quality = False
         self.log_frame_timing = False
 
         self._last_heartbeat_time: float = 0
+        self._heartbeat_received = False
         self._frame_buffer_bytes = bytearray()
         # self._dbg_command_stats = {}
         self._video_stream: Optional[av.video.VideoStream] = None
         self._video_container: Optional[av.container.OutputContainer] = None
+        # Frames are encoded on a separate thread so that encoding doesn't hold up rendering. If the encoder falls
+        # behind, new frames are dropped rather than queued up.
+        self._encode_queue: FrameQueue[Optional[Tuple[bytearray, SSVStreamingMode, Tuple[int, int],
+                                                      Optional[float]]]] = FrameQueue(maxsize=2)
+        self._free_frame_buffers: FrameQueue[bytearray] = FrameQueue()
+        self._encode_thread: Optional[Thread] = None
+        # The encode quality actually used when adaptive quality is enabled, along with frame drop statistics
+        self._adaptive_encode_quality: Optional[float] = None
+        self._adaptive_frames = 0
+        self._adaptive_dropped_frames = 0
+        self._video_encoder_lock = Lock()
+        # Encoded frames are passed to the client through a ring of shared memory slots which saves pickling them
+        # through the command queue. The client hands slots back with the "FrRl" command once it has read them.
+        self._frame_slots: List[Optional[shared_memory.SharedMemory]] = [None] * self._frame_slot_count
+        self._free_frame_slots: FrameQueue[int] = FrameQueue()
+        for slot in range(self._frame_slot_count):
+            self._free_frame_slots.put(slot)
+        # A copy of the last image frame sent to the client and the settings it was encoded with, static scenes can
+        # then skip encoding and sending frames which are identical to the last one.
+        self._last_sent_frame = bytearray()
+        self._last_sent_frame_key: Optional[Tuple[SSVStreamingMode, Tuple[int, int], Optional[float]]] = None
+        self._last_sent_frame_time = 0.0
 
         # Frame time stats for debugging
         self.avg_delta_time = 1/self.target_framerate
@@ -73,6 +107,24 @@ class SSVRenderProcessServer:
         self.__init_video_encoder()
         self.__init_render_process(backend, gl_version)
 
+    _frame_slot_count = 3
+    # How long to wait without a heartbeat from the client before pausing rendering. Browsers throttle timers in
+    # background tabs to once per second, so this needs to be comfortably longer than that.
+    _heartbeat_stale_time = 2.5
+    # How many frames adaptive quality waits for between quality adjustments
+    _adaptive_quality_window = 30
+    # The longest time in seconds an unchanged image frame can go without being re-sent to the client
+    _unchanged_frame_resend_time = 1.0
+    # The alpha channel isn't needed for streaming, so it isn't read back from the renderer
+    _stream_components = 3
+
+    # Streaming modes where each frame is encoded as a standalone image
+    _image_formats: Set[SSVStreamingMode] = {
+        SSVStreamingMode.JPG,
+        SSVStreamingMode.PNG,
+        SSVStreamingMode.WEBP
+    }
+
     _supported_video_formats: Set[SSVStreamingMode] = {
         SSVStreamingMode.H264,
         SSVStreamingMode.HEVC,
@@ -86,6 +138,7 @@ class SSVRenderProcessServer:
     _streaming_format_quality_scaling: Dict[SSVStreamingMode, int] = {
         SSVStreamingMode.JPG: 100,
         SSVStreamingMode.PNG: 7,
+        SSVStreamingMode.WEBP: 100,
         SSVStreamingMode.VP8: 3500000,
         SSVStreamingMode.VP9: 3500000,
         SSVStreamingMode.H264: 40000000,
@@ -114,11 +167,21 @@ class SSVRenderProcessServer:
                 # print(f"Writing: {len(__b)} bytes...")
                 return len(__b)
 
+        with self._video_encoder_lock:
+            self.__create_video_stream(FakeIO())
+
+    def __create_video_stream(self, output):
+        """
+        Creates a new video stream for the current stream_mode, closing the previous one. The video encoder lock must
+        be held when calling this.
+
+        :param output: the file object to write the video container to.
+        """
         if self._video_container is not None:
             self._video_container.close()
 
         # Setting format to "null" here effectively disables muxing
-        self._video_container = av.open(FakeIO(), mode="w", format="null")
+        self._video_container = av.open(output, mode="w", format="null")
         # self._video_container.flags |= self._video_container.flags.FLUSH_PACKETS
 
         stream = self._video_container.add_stream(self.stream_mode.value, rate=self.target_framerate)
@@ -172,13 +235,16 @@ class SSVRenderProcessServer:
 
         :param backend: the render backend to use.
         """
-        if backend == "opengl":
+        if backend == SSVBackend.OPENGL.value:
             self._renderer = SSVRenderOpenGL(gl_version, self._use_renderdoc_api)
         else:
             self._renderer = None
             log(f"Backend '{backend}' does not exist!", logging.ERROR)
             return
 
+        self._encode_thread = Thread(target=self.__encode_loop, name=f"{current_process().name}_encoder",
+                                     daemon=True)
+        self._encode_thread.start()
         self.__render_process_loop()
 
     def __render_process_loop(self):
@@ -186,22 +252,40 @@ class SSVRenderProcessServer:
         Runs the main render process loop. This function continuously checks for new render commands and
         dispatches render frame commands as needed.
         """
-        last_frame_time = time.perf_counter()
+        # Cache frequently used functions and attributes in locals, this loop runs very often
+        perf_counter = time.perf_counter
+        monotonic = time.monotonic
+        command_queue_rx = self._command_queue_rx
+
+        last_frame_time = perf_counter()
         timeout = 0
 
-        self._last_heartbeat_time = time.monotonic()
+        self._last_heartbeat_time = monotonic()
 
         frame = 0
+        was_rendering = False
         while True:
             # Check heartbeat
-            if self.watchdog_time is not None and (time.monotonic() - self._last_heartbeat_time) > self.watchdog_time:
+            heartbeat_age = monotonic() - self._last_heartbeat_time
+            if self.watchdog_time is not None and heartbeat_age > self.watchdog_time:
                 self.__shutdown("watchdog")
                 return
+            # If the client was sending heartbeats but has stopped (the widget is no longer being displayed for
+            # instance), then there's no one to send frames to, so don't bother rendering them until it comes back.
+            heartbeat_stale = self._heartbeat_received and heartbeat_age > self._heartbeat_stale_time
+            rendering = self.running and not heartbeat_stale
+            if was_rendering and not rendering:
+                # Frames are read back a frame late, so make sure the last one still gets sent
+                self.__send_pending_frame()
+            was_rendering = rendering
+
+            # The target framerate can be changed by a render command, so this is updated every iteration
+            frame_interval = 1 / self.target_framerate if self.target_framerate > 0 else 0
 
             # Render the next frame if it's time to
-            delta_time = time.perf_counter() - last_frame_time
-            if self.running and (self.target_framerate <= 0 or delta_time >= 1 / self.target_framerate):
-                last_frame_time = time.perf_counter()
+            delta_time = perf_counter() - last_frame_time
+            if rendering and delta_time >= frame_interval:
+                last_frame_time = perf_counter()
                 self.__render_frame()
 
                 # Frame time stats
@@ -220,8 +304,8 @@ class SSVRenderProcessServer:
                         self.max_delta_time_encode = 0
 
             # Execute any render commands that are waiting for us
-            if self._command_queue_rx.qsize() > 0:
-                size = self._command_queue_rx.qsize()
+            size = command_queue_rx.qsize()
+            if size > 0:
                 # if size > 32:
                 #     log(f"Render process is struggling to keep up! Command queue size>32 (={size})",
                 #         severity=logging.WARN)
@@ -233,9 +317,16 @@ class SSVRenderProcessServer:
                         return
             else:
                 # Work out how long the command processor can block for
-                delta_time = time.perf_counter() - last_frame_time
-                if self.running and self.target_framerate > 0:
-                    timeout = max(1 / self.target_framerate - delta_time, 0) * 0.5
+                delta_time = perf_counter() - last_frame_time
+                if rendering and frame_interval > 0:
+                    timeout = max(frame_interval - delta_time, 0) * 0.5
+                    # Because Queue.get() uses time.monotonic() internally, it doesn't have the required timeout
+                    # precision for frame pacing.
+                    time.sleep(timeout)
+                    continue
+                elif heartbeat_stale:
+                    # Check back regularly so that rendering resumes promptly when heartbeats resume
+                    timeout = 0.1
                 else:
                     # If this timeout is infinite then the watchdog can't kill paused render processes which also need
                     # to be killed otherwise all the RenderDoc sockets get used up...
@@ -244,13 +335,12 @@ class SSVRenderProcessServer:
                     else:
                         timeout = min(self.watchdog_time*0.5, 1)
 
-                # Wait for <timeout and (potentially) execute one render command
-                # if not self.__parse_render_command(timeout):
-                #     self.__shutdown("requested by client")
-                #     return
-                # Because Queue.get() uses time.monotonic() internally, it doesn't have the required timeout precision
-                # for our use case.
-                time.sleep(timeout)
+                # There's no frame to pace, so wait for <timeout and (potentially) execute one render command. Unlike
+                # sleeping, this wakes up as soon as a command arrives, so queries sent while idle (like the ones made
+                # when creating a canvas) are answered straight away.
+                if not self.__parse_render_command(timeout):
+                    self.__shutdown("requested by client")
+                    return
 
     def __send_async_result(self, query_id: int, *args):
         """
@@ -298,9 +388,13 @@ class SSVRenderProcessServer:
             pass
         elif command == "Stop":
             return False
+        elif command == "FrRl":
+            # Frame slot Released
+            self._free_frame_slots.put(command_args[0])
         elif command == "HrtB":
             # Heartbeat
             self._last_heartbeat_time = time.monotonic()
+            self._heartbeat_received = True
         elif command == "SWdg":
             # Set Watchdog time
             self.watchdog_time = command_args[0]
@@ -315,15 +409,28 @@ class SSVRenderProcessServer:
         elif command == "Rndr":
             # A render command needs to count as the first heartbeat so that the watchdog doesn't kill us immediately
             self._last_heartbeat_time = time.monotonic()
+            # Send the last rendered frame with the settings it was rendered with, this also makes sure the first
+            # frame rendered with the new settings isn't an old one from the asynchronous read back
+            self.__send_pending_frame()
             # Start rendering at a given framerate
             self.target_framerate = command_args[0]
             self.stream_mode = SSVStreamingMode(command_args[1])
             self.encode_quality = command_args[2]
+            self.adaptive_quality = len(command_args) > 3 and command_args[3]
+            self._adaptive_encode_quality = self.encode_quality
+            self._adaptive_frames = 0
+            self._adaptive_dropped_frames = 0
+            # Always send the first frame after (re)starting
+            self._last_sent_frame_key = None
             self.__init_video_encoder()
             self.running = self.target_framerate != 0
         elif command == "UpdU":
             # Update Uniform
             self._renderer.update_uniform(*command_args)
+        elif command == "UpdB":
+            # Update a Batch of uniforms
+            for uniform in command_args[0]:
+                self._renderer.update_uniform(*uniform)
         elif command == "UpdV":
             # Update Vertex buffer
             self._renderer.update_vertex_buffer(*command_args)
@@ -389,50 +496,195 @@ class SSVRenderProcessServer:
         :param reason: a string describing why this process is shutting down.
         """
         log(f"Render process shutting down... ({reason})", severity=logging.WARN)
+        if self._encode_thread is not None:
+            self._encode_queue.put(None)
+            self._encode_thread.join()
+        for frame_slot in self._frame_slots:
+            if frame_slot is not None:
+                frame_slot.close()
+                frame_slot.unlink()
         if self._video_container is not None:
             self._video_container.close()
         self._command_queue_tx.put(("Stop",))
 
     def __render_frame(self):
         """
-        Asks the renderer to render the next frame and sends the new frame back to the client.
+        Asks the renderer to render the next frame and queues it to be encoded and sent back to the client.
         """
         start_time = time.perf_counter()
-        render_time = start_time
 
         if not self._renderer.render():
             self.running = False
 
-        if self.stream_mode == SSVStreamingMode.PNG:
-            if len(self._frame_buffer_bytes) == self.output_size[0]*self.output_size[1] * 4:
-                self._renderer.read_frame_into(self._frame_buffer_bytes)
-            else:
-                self._frame_buffer_bytes = bytearray(self._renderer.read_frame())
-            render_time = time.perf_counter()
-            stream_data = self.__to_png(self._frame_buffer_bytes, self.output_size, self.encode_quality)
-        elif self.stream_mode == SSVStreamingMode.JPG:
-            if len(self._frame_buffer_bytes) == self.output_size[0] * self.output_size[1] * 3:
-                self._renderer.read_frame_into(self._frame_buffer_bytes, 3)
-            else:
-                self._frame_buffer_bytes = bytearray(self._renderer.read_frame(3))
-            render_time = time.perf_counter()
-            stream_data = self.__to_jpg(self._frame_buffer_bytes, self.output_size, self.encode_quality)
-        elif self.stream_mode in self._supported_video_formats:
-            if len(self._frame_buffer_bytes) == self.output_size[0] * self.output_size[1] * 3:
-                self._renderer.read_frame_into(self._frame_buffer_bytes, 3)
-            else:
-                self._frame_buffer_bytes = bytearray(self._renderer.read_frame(3))
-            render_time = time.perf_counter()
-            stream_data = self.__encode_video_frame(self._frame_buffer_bytes)
-        else:
-            stream_data = None
-        # if self.log_frame_timing:
-        encode_time = time.perf_counter()
+        stream_mode = self.stream_mode
+        if stream_mode not in self._image_formats and stream_mode not in self._supported_video_formats:
+            self._command_queue_tx.put(("NFrm", None))
+            return
+
+        frame = self.__get_frame_buffer()
+        self._renderer.read_frame_into_async(frame, self._stream_components)
+
+        render_time = time.perf_counter()
         self.max_delta_time = max(self.max_delta_time, render_time - start_time)
-        self.max_delta_time_encode = max(self.max_delta_time_encode, encode_time - render_time)
         self.avg_delta_time = self.avg_delta_time * 0.9 + (render_time - start_time) * 0.1
-        self.avg_delta_time_encode = self.avg_delta_time_encode * 0.9 + (encode_time - render_time) * 0.1
-        self._command_queue_tx.put(("NFrm", stream_data))
+
+        self.__queue_frame_for_encode(frame)
+
+    def __send_pending_frame(self):
+        """
+        Queues the frame still waiting to be read back from the renderer to be encoded and sent to the client.
+        """
+        if self.stream_mode not in self._image_formats and self.stream_mode not in self._supported_video_formats:
+            return
+        frame = self.__get_frame_buffer()
+        if self._renderer.read_pending_frame_into(frame, self._stream_components):
+            self.__queue_frame_for_encode(frame)
+        else:
+            self._free_frame_buffers.put(frame)
+
+    def __get_frame_buffer(self) -> bytearray:
+        """
+        Gets a free buffer large enough to hold a frame to stream.
+
+        :return: the frame buffer.
+        """
+        try:
+            frame = self._free_frame_buffers.get_nowait()
+        except Empty:
+            frame = bytearray()
+        n_bytes = self.output_size[0] * self.output_size[1] * self._stream_components
+        if len(frame) != n_bytes:
+            frame = bytearray(n_bytes)
+        return frame
+
+    def __queue_frame_for_encode(self, frame: bytearray):
+        """
+        Queues a frame to be encoded and sent to the client, or drops it if the encoder is falling behind.
+
+        :param frame: the frame to encode.
+        """
+        stream_mode = self.stream_mode
+        adaptive_quality = self.adaptive_quality and stream_mode == SSVStreamingMode.JPG
+        encode_quality = self._adaptive_encode_quality if adaptive_quality else self.encode_quality
+        try:
+            self._encode_queue.put_nowait((frame, stream_mode, self.output_size, encode_quality))
+            dropped = False
+        except Full:
+            # The encoder can't keep up, drop this frame instead of adding latency
+            self._free_frame_buffers.put(frame)
+            dropped = True
+
+        if adaptive_quality:
+            self.__update_adaptive_quality(dropped)
+
+    def __update_adaptive_quality(self, dropped: bool):
+        """
+        Lowers the encode quality when the encoder has been dropping frames and raises it back towards the requested
+        quality once the encoder is keeping up again.
+
+        :param dropped: whether the current frame was dropped.
+        """
+        self._adaptive_frames += 1
+        if dropped:
+            self._adaptive_dropped_frames += 1
+        if self._adaptive_frames < self._adaptive_quality_window:
+            return
+
+        # 75 is the quality the jpeg encoder uses by default
+        max_quality = self.encode_quality if self.encode_quality is not None else 75
+        quality = self._adaptive_encode_quality if self._adaptive_encode_quality is not None else max_quality
+        if self._adaptive_dropped_frames > self._adaptive_quality_window // 10:
+            quality = max(quality - 5, min(40, max_quality))
+        elif self._adaptive_dropped_frames == 0:
+            quality = min(quality + 5, max_quality)
+        self._adaptive_encode_quality = quality
+        self._adaptive_frames = 0
+        self._adaptive_dropped_frames = 0
+
+    def __encode_loop(self):
+        """
+        Runs the frame encoder loop. This function encodes frames queued by the render loop and sends them to the
+        client until it receives ``None``.
+        """
+        while True:
+            job = self._encode_queue.get()
+            if job is None:
+                return
+            frame, stream_mode, output_size, encode_quality = job
+
+            start_time = time.perf_counter()
+            is_image = stream_mode in self._image_formats
+            if is_image and self.__is_unchanged_frame(frame, (stream_mode, output_size, encode_quality)):
+                # Still let the client know that a frame was rendered, it just doesn't need to display anything new
+                self._free_frame_buffers.put(frame)
+                self._command_queue_tx.put(("NFrm", None))
+                continue
+            try:
+                if stream_mode == SSVStreamingMode.PNG:
+                    stream_data = self.__to_png(frame, output_size, encode_quality, has_alpha=False)
+                elif stream_mode == SSVStreamingMode.JPG:
+                    stream_data = self.__to_jpg(frame, output_size, encode_quality)
+                elif stream_mode == SSVStreamingMode.WEBP:
+                    stream_data = self.__to_webp(frame, output_size, encode_quality)
+                else:
+                    with self._video_encoder_lock:
+                        stream_data = self.__encode_video_frame(frame, output_size)
+                if is_image:
+                    self._last_sent_frame[:] = frame
+                    self._last_sent_frame_key = (stream_mode, output_size, encode_quality)
+                    self._last_sent_frame_time = time.monotonic()
+            except Exception as ex:
+                log(f"Failed to encode frame: {ex}", severity=logging.ERROR)
+                continue
+            finally:
+                self._free_frame_buffers.put(frame)
+
+            encode_time = time.perf_counter() - start_time
+            self.max_delta_time_encode = max(self.max_delta_time_encode, encode_time)
+            self.avg_delta_time_encode = self.avg_delta_time_encode * 0.9 + encode_time * 0.1
+            self.__send_frame(stream_data)
+
+    def __is_unchanged_frame(self, frame: bytearray,
+                             frame_key: Tuple[SSVStreamingMode, Tuple[int, int], Optional[float]]) -> bool:
+        """
+        Checks whether a frame is identical to the last frame sent to the client and was encoded with the same
+        settings. Unchanged frames are still re-sent every ``_unchanged_frame_resend_time`` seconds.
+
+        :param frame: the raw frame to check.
+        :param frame_key: the stream mode, resolution, and encode quality of the frame.
+        :return: ``True`` if the frame doesn't need to be sent.
+        """
+        return (frame_key == self._last_sent_frame_key
+                and time.monotonic() - self._last_sent_frame_time < self._unchanged_frame_resend_time
+                and frame == self._last_sent_frame)
+
+    def __send_frame(self, stream_data: bytes):
+        """
+        Sends an encoded frame to the client. When a shared memory slot is free, the frame is copied into it and only
+        the slot's details are sent through the command queue; otherwise the frame is sent through the queue directly.
+
+        :param stream_data: the encoded frame.
+        """
+        n_bytes = len(stream_data)
+        try:
+            slot = self._free_frame_slots.get_nowait() if n_bytes > 0 else None
+        except Empty:
+            slot = None
+        if slot is None:
+            self._command_queue_tx.put(("NFrm", stream_data))
+            return
+
+        frame_slot = self._frame_slots[slot]
+        if frame_slot is None or frame_slot.size < n_bytes:
+            if frame_slot is not None:
+                frame_slot.close()
+                frame_slot.unlink()
+            # Leave some headroom so that the slot doesn't need to be reallocated every time the frame grows
+            frame_slot = shared_memory.SharedMemory(create=True, size=max(n_bytes * 5 // 4, 1 << 16))
+            self._frame_slots[slot] = frame_slot
+
+        cast(memoryview, frame_slot.buf)[:n_bytes] = stream_data
+        self._command_queue_tx.put(("NFrS", slot, frame_slot.name, n_bytes))
 
     def __save_image(self, image_type: SSVStreamingMode, quality: float, size: Optional[Tuple[int, int]],
                      render_buffer: int, suppress_ui: bool) -> bytes:
@@ -469,14 +721,22 @@ class SSVRenderProcessServer:
                 frame = self._frame_buffer_bytes
             else:
                 frame = bytearray(self._renderer.read_frame(4, render_buffer))
-            stream_data = self.__to_png(frame, render_size, quality, True)
+            stream_data = b"data:image/png;base64," + base64.b64encode(self.__to_png(frame, render_size, quality, True))
         elif image_type == SSVStreamingMode.JPG:
             if len(self._frame_buffer_bytes) == render_size[0] * render_size[1] * 3:
                 self._renderer.read_frame_into(self._frame_buffer_bytes, 3, render_buffer)
                 frame = self._frame_buffer_bytes
             else:
                 frame = bytearray(self._renderer.read_frame(3, render_buffer))
-            stream_data = self.__to_jpg(frame, render_size, quality, True)
+            stream_data = b"data:image/jpg;base64," + base64.b64encode(self.__to_jpg(frame, render_size, quality, True))
+        elif image_type == SSVStreamingMode.WEBP:
+            if len(self._frame_buffer_bytes) == render_size[0] * render_size[1] * 3:
+                self._renderer.read_frame_into(self._frame_buffer_bytes, 3, render_buffer)
+                frame = self._frame_buffer_bytes
+            else:
+                frame = bytearray(self._renderer.read_frame(3, render_buffer))
+            stream_data = (b"data:image/webp;base64,"
+                           + base64.b64encode(self.__to_webp(frame, render_size, quality, True)))
         else:
             log(f"Can't save image in format '{image_type}'!", severity=logging.ERROR)
             stream_data = b''
@@ -489,50 +749,85 @@ class SSVRenderProcessServer:
         return stream_data
 
     def __to_png(self, frame: bytearray, output_size: Tuple[int, int], encode_quality: float,
-                 flip_y: bool = False) -> bytes:
+                 flip_y: bool = False, has_alpha: bool = True) -> bytes:
         """
-        Converts a framebuffer into a base64 encoded png data url.
+        Encodes a framebuffer as a png image.
 
-        :param frame: the frame as an RGBA8888 buffer of bytes.
+        :param frame: the frame as an RGBA8888 (or RGB888 if ``has_alpha`` is ``False``) buffer of bytes.
         :param output_size: the resolution of the frame.
         :param encode_quality: the encoding quality (0-100).
         :param flip_y: whether the frame should be flipped vertically.
-        :return: a data url string containing the frame.
+        :param has_alpha: whether the frame has an alpha channel.
+        :return: the encoded image bytes.
         """
-        image = Image.frombytes('RGBA', output_size, frame)
-        if flip_y:
-            image = image.transpose(Image.FLIP_TOP_BOTTOM)
+        from PIL import Image
+        mode = 'RGBA' if has_alpha else 'RGB'
+        # The raw decoder can read the rows bottom-up, which saves flipping the image afterwards
+        image = Image.frombytes(mode, output_size, frame, 'raw', mode, 0, -1 if flip_y else 1)
         image_bytes = BytesIO()
         quality = 5
         if encode_quality is not None:
             quality = min(max(round(
                 encode_quality / 100 * self._streaming_format_quality_scaling[SSVStreamingMode.PNG]), 0), 7)
         image.save(image_bytes, format='png', optimize=False, compress_level=quality)
-        return b"data:image/png;base64," + base64.b64encode(image_bytes.getvalue())
+        return image_bytes.getvalue()
 
     def __to_jpg(self, frame: bytearray, output_size: Tuple[int, int], encode_quality: float,
                  flip_y: bool = False) -> bytes:
         """
-        Converts a framebuffer into a base64 encoded jpeg data url.
+        Encodes a framebuffer as a jpeg image.
 
         :param frame: the frame as an RGB888 buffer of bytes.
         :param output_size: the resolution of the frame.
         :param encode_quality: the encoding quality (0-100).
         :param flip_y: whether the frame should be flipped vertically.
-        :return: a data url string containing the frame.
+        :return: the encoded image bytes.
         """
-        image = Image.frombytes('RGB', output_size, frame)
-        if flip_y:
-            image = image.transpose(Image.FLIP_TOP_BOTTOM)
-        image_bytes = BytesIO()
         quality = 75
         if encode_quality is not None:
             quality = min(max(round(
                 encode_quality / 100 * self._streaming_format_quality_scaling[SSVStreamingMode.JPG]), 0), 100)
+        if simplejpeg is not None:
+            pixels = np.frombuffer(frame, dtype=np.uint8).reshape((output_size[1], output_size[0], 3))
+            if flip_y:
+                # libjpeg-turbo doesn't accept negative strides
+                pixels = np.ascontiguousarray(pixels[::-1])
+            # Match PIL's default chroma subsampling
+            jpg_bytes = simplejpeg.encode_jpeg(pixels, quality=quality, colorspace='RGB', colorsubsampling='420')
+            return jpg_bytes
+
+        from PIL import Image
+        # The raw decoder can read the rows bottom-up, which saves flipping the image afterwards
+        image = Image.frombytes('RGB', output_size, frame, 'raw', 'RGB', 0, -1 if flip_y else 1)
+        image_bytes = BytesIO()
         image.save(image_bytes, format='jpeg', quality=quality)
-        return b"data:image/jpg;base64," + base64.b64encode(image_bytes.getvalue())
+        return image_bytes.getvalue()
 
-    def __encode_video_frame(self, frame: bytearray) -> bytes:
+    def __to_webp(self, frame: bytearray, output_size: Tuple[int, int], encode_quality: float,
+                  flip_y: bool = False) -> bytes:
+        """
+        Encodes a framebuffer as a lossy webp image.
+
+        :param frame: the frame as an RGB888 buffer of bytes.
+        :param output_size: the resolution of the frame.
+        :param encode_quality: the encoding quality (0-100).
+        :param flip_y: whether the frame should be flipped vertically.
+        :return: the encoded image bytes.
+        """
+        from PIL import Image
+        quality = 75
+        if encode_quality is not None:
+            quality = min(max(round(
+                encode_quality / 100 * self._streaming_format_quality_scaling[SSVStreamingMode.WEBP]), 0), 100)
+        # The raw decoder can read the rows bottom-up, which saves flipping the image afterwards
+        image = Image.frombytes('RGB', output_size, frame, 'raw', 'RGB', 0, -1 if flip_y else 1)
+        image_bytes = BytesIO()
+        # Method 0 is libwebp's fastest encoder preset, slower presets make frames a little smaller but take several
+        # times longer to encode
+        image.save(image_bytes, format='webp', quality=quality, method=0)
+        return image_bytes.getvalue()
+
+    def __encode_video_frame(self, frame: bytearray, output_size: Tuple[int, int]) -> bytes:
         """
         Encodes a frame using the initialized video encoder and returns the produced video packet.
 
@@ -540,6 +835,7 @@ class SSVRenderProcessServer:
         then this method may return an empty bytes, and the bytes returned may not necessarily be for the current frame.
 
         :param frame: the frame as an RGB888 buffer of bytes.
+        :param output_size: the resolution of the frame.
         :return: the encoded frame as bytes.
         """
         if self._video_stream is None:
@@ -548,7 +844,7 @@ class SSVRenderProcessServer:
         # img = Image.frombytes("RGB", self.output_size, frame)
         # av_frame = av.VideoFrame.from_image(img)
         frame_np: npt.NDArray[np.uint8] = np.array(frame, copy=False, dtype=np.uint8)
-        frame_np = frame_np.reshape((self.output_size[1], self.output_size[0], 3))
+        frame_np = frame_np.reshape((output_size[1], output_size[0], 3))
         av_frame = av.VideoFrame.from_ndarray(frame_np, format="rgb24")
         packets = self._video_stream.encode(av_frame)
         if len(packets) == 1:
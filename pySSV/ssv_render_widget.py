@@ -6,8 +6,8 @@
 
 from ipywidgets import DOMWidget, CallbackDispatcher  # type: ignore
 import logging
-from io import TextIOBase
-from typing import Callable, Optional, Tuple
+from threading import Lock, Timer
+from typing import Callable, Optional, Tuple, List
 import sys
 if sys.version_info >= (3, 10):
     from typing import TypeAlias
@@ -16,7 +16,7 @@ else:
 from traitlets import Unicode, Enum, Int, Bool, Float, Bytes  # type: ignore
 from ._frontend import module_name, module_version
 from .ssv_render import SSVStreamingMode
-from .ssv_logging import log
+from .ssv_logging import log, SSVLogStream
 
 
 OnMessageDelegate: TypeAlias = Callable[[], None]
@@ -193,10 +193,39 @@ class SSVRenderWidget(DOMWidget):
         self.send({"download_file": {"name": filename, "length": len(data)}}, buffers=[data])
 
 
-class SSVRenderWidgetLogIO(TextIOBase):
+class SSVRenderWidgetLogIO(SSVLogStream):
+    """
+    A log stream which writes log messages to an ``SSVRenderWidget``'s log panel. Messages are buffered for a short
+    time and sent to the widget in batches so that bursts of log messages don't each need their own comm message.
+    """
+    # How long in seconds to buffer log messages for before sending them to the widget
+    _flush_interval = 0.1
+
     def __init__(self, widget: SSVRenderWidget):
         self._widget = widget
-
-    def write(self, __s: str) -> int:
-        self._widget.status_logs = __s
-        return len(__s)
+        self._pending: List[str] = []
+        self._lock = Lock()
+        self._flush_timer: Optional[Timer] = None
+
+    def write(self, text: str, severity: int = logging.INFO) -> int:
+        with self._lock:
+            self._pending.append(text)
+            if self._flush_timer is None:
+                self._flush_timer = Timer(self._flush_interval, self.send_pending)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        return len(text)
+
+    def send_pending(self):
+        """
+        Sends all the buffered log messages to the widget immediately.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+        if pending:
+            self._widget.status_logs = "".join(pending)
@@ -1,8 +1,13 @@
 #  Copyright (c) 2023-2024 Thomas Mathieson.
 #  Distributed under the terms of the MIT license.
+import hashlib
 import io
+import json
 import logging
 import os.path
+import tempfile
+from collections import OrderedDict
+from threading import Lock
 from typing import Any, Optional, Union, List, Dict, Tuple
 
 import argparse
@@ -16,6 +21,24 @@ from .ssv_logging import log
 from .ssv_pragma_parser import SSVShaderPragmaParser, SSVTemplatePragmaParser, SSVTemplatePragmaData
 from .ssv_shader_source_preprocessor import SSVShaderSourcePreprocessor
 
+try:
+    from ._version import __version__  # type: ignore
+except ImportError:
+    __version__ = "dev"
+
+
+def _default_disk_cache_dir() -> Optional[str]:
+    """
+    Gets the directory preprocessed shaders are cached in between sessions.
+
+    :return: the path to the cache directory or ``None`` if the on-disk cache should be disabled.
+    """
+    if __version__ == "dev":
+        # The built-in templates and the preprocessor itself can change without the version number changing
+        return None
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "pySSV", "shaders")
+
 
 class SSVShaderPreprocessor:
     """
@@ -31,6 +54,24 @@ class SSVShaderPreprocessor:
         self._template_parser = SSVTemplatePragmaParser()
         self._shader_parser = SSVShaderPragmaParser()
 
+    # These caches are shared by all preprocessors so that they survive a notebook cell creating a new canvas for the
+    # same shader. Nothing instance specific needs to be in their keys; everything about an instance which affects the
+    # output ends up in the defines.
+    _preprocess_cache: "OrderedDict[Tuple[Any, ...], Dict[str, str]]" = OrderedDict()
+    _template_metadata_cache: "OrderedDict[Tuple[str, Optional[str]], Dict[str, List[SSVTemplatePragmaData]]]" = \
+        OrderedDict()
+    _cache_lock = Lock()
+    # Preprocessed shaders are also cached on disk so that they survive kernel restarts. An empty string uses the
+    # default location (looked up whenever it's needed, so that changes to XDG_CACHE_HOME are respected), None disables
+    # the on-disk cache.
+    _disk_cache_dir: Optional[str] = ""
+    # The maximum number of preprocessed shaders to keep on disk, the least recently used ones are removed first
+    _disk_cache_max_entries = 256
+    # The maximum number of preprocessed shaders to keep in the cache
+    _preprocess_cache_size = 32
+    # The maximum number of parsed shader templates to keep in the cache
+    _template_metadata_cache_size = 32
+
     @property
     def global_defines(self) -> Dict[str, str]:
         """
@@ -166,6 +207,30 @@ class SSVShaderPreprocessor:
 
         return defines
 
+    def _parse_template(self, template_source: str,
+                        template_path: Optional[str] = None) -> Dict[str, List[SSVTemplatePragmaData]]:
+        """
+        Parses the #pragma directives of a shader template. Parsing is slow and the same few templates tend to be
+        parsed over and over again, so results are cached by the template's source code.
+
+        :param template_source: the source of the shader template.
+        :param template_path: the path to the source file.
+        :return: a dictionary of parsed shader template commands.
+        """
+        cache_key = (template_source, template_path)
+        with self._cache_lock:
+            template_metadata = self._template_metadata_cache.get(cache_key)
+            if template_metadata is not None:
+                self._template_metadata_cache.move_to_end(cache_key)
+                return template_metadata
+
+        template_metadata = self._template_parser.parse(template_source, template_path)
+        with self._cache_lock:
+            self._template_metadata_cache[cache_key] = template_metadata
+            if len(self._template_metadata_cache) > self._template_metadata_cache_size:
+                self._template_metadata_cache.popitem(last=False)
+        return template_metadata
+
     def _find_shader_template(self, template_name, additional_template_directory, additional_templates):
         """
         Searches for a shader template given its name.
@@ -183,7 +248,7 @@ class SSVShaderPreprocessor:
         # Check the additional_templates first
         if additional_templates is not None:
             for template in additional_templates:
-                template_metadata = self._template_parser.parse(template, "additional_templates[]")
+                template_metadata = self._parse_template(template, "additional_templates[]")
                 for pragma in template_metadata["define"]:
                     if pragma.name.lower() == template_name.lower():
                         template_source = template
@@ -256,7 +321,7 @@ class SSVShaderPreprocessor:
                                                                     additional_template_directory, additional_templates)
 
         # Parse template args
-        template_metadata = self._template_parser.parse(template_source, template_path)
+        template_metadata = self._parse_template(template_source, template_path)
 
         # Construct and argparse using the template metadata
         template_argparse = self._make_argparse(template_metadata)
@@ -269,8 +334,24 @@ class SSVShaderPreprocessor:
             if template_data.shader_stage is not None:
                 stages.extend(template_data.shader_stage)
 
+        # Running the preprocessor is by far the slowest step, so its output is cached. The defines capture all the
+        # state of this class which affects the output.
+        cache_key = (source, filepath, template_path, template_source, tuple(defines))
+        with self._cache_lock:
+            cached_shaders = self._preprocess_cache.get(cache_key)
+            if cached_shaders is not None:
+                self._preprocess_cache.move_to_end(cache_key)
+                return dict(cached_shaders)
+        disk_cache_path = self._get_disk_cache_path(cache_key)
+        cached_shaders = self._read_disk_cache(disk_cache_path)
+        if cached_shaders is not None:
+            self._add_to_cache(cache_key, cached_shaders)
+            return dict(cached_shaders)
+
         # Preprocess the template
         compiled_shaders = {}
+        # Shaders which failed to preprocess or which include files from disk (which might change) aren't cached
+        cacheable = True
         for stage in stages:
             preprocessor = SSVShaderSourcePreprocessor(source)
             defines_stage = defines + [(f"SHADER_STAGE_{stage.upper()}", "1")]
@@ -285,13 +366,120 @@ class SSVShaderPreprocessor:
             shader = io.StringIO()
             preprocessor.write(shader)
             compiled_shaders[f"{stage}_shader"] = shader.getvalue()
+            if preprocessor.return_code != 0 or preprocessor.opened_external_files:
+                cacheable = False
         primitive_type = None
         for p in template_metadata.get("input_primitive", []):
             primitive_type = p.primitive_type
         if primitive_type is not None:
             compiled_shaders["primitive_type"] = primitive_type
+
+        if cacheable:
+            self._add_to_cache(cache_key, dict(compiled_shaders))
+            self._write_disk_cache(disk_cache_path, compiled_shaders)
         return compiled_shaders
 
+    def _add_to_cache(self, cache_key: Tuple[Any, ...], shaders: Dict[str, str]):
+        with self._cache_lock:
+            self._preprocess_cache[cache_key] = shaders
+            if len(self._preprocess_cache) > self._preprocess_cache_size:
+                self._preprocess_cache.popitem(last=False)
+
+    def _get_disk_cache_path(self, cache_key: Tuple[Any, ...]) -> Optional[str]:
+        """
+        Gets the path of the file a preprocessed shader would be cached in on disk.
+
+        :param cache_key: the preprocessor cache key of the shader.
+        :return: the path to the cache file or ``None`` if the on-disk cache is disabled.
+        """
+        cache_dir = self._disk_cache_dir
+        if cache_dir == "":
+            cache_dir = _default_disk_cache_dir()
+        if cache_dir is None:
+            return None
+        key_hash = hashlib.sha256(json.dumps((__version__, cache_key)).encode("utf-8")).hexdigest()
+        return os.path.join(cache_dir, f"{key_hash}.json")
+
+    @staticmethod
+    def _read_disk_cache(path: Optional[str]) -> Optional[Dict[str, str]]:
+        """
+        Reads a preprocessed shader from the on-disk cache.
+
+        :param path: the path to the cache file.
+        :return: the dict of compiled shaders or ``None`` if the shader isn't in the cache.
+        """
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                shaders = json.load(f)
+        except (OSError, ValueError) as e:
+            log(f"[ShaderPreprocessor] Failed to read cached shader '{path}': {e}", severity=logging.DEBUG)
+            return None
+        if not isinstance(shaders, dict):
+            return None
+        try:
+            # Mark the entry as recently used so that it isn't the first to be evicted
+            os.utime(path)
+        except OSError:
+            pass
+        return shaders
+
+    @classmethod
+    def _write_disk_cache(cls, path: Optional[str], shaders: Dict[str, str]):
+        """
+        Writes a preprocessed shader to the on-disk cache. The file is written atomically so that other processes
+        never see a partially written cache entry. If the cache has grown too large, the least recently used entries
+        are removed.
+
+        :param path: the path to the cache file.
+        :param shaders: the dict of compiled shaders to cache.
+        """
+        if path is None:
+            return
+        cache_dir = os.path.dirname(path)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(shaders, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except OSError as e:
+            # Caching is only an optimisation, a read-only home directory shouldn't stop shaders from working
+            log(f"[ShaderPreprocessor] Failed to write shader cache '{path}': {e}", severity=logging.DEBUG)
+            return
+
+        cls._evict_disk_cache(cache_dir)
+
+    @classmethod
+    def _evict_disk_cache(cls, cache_dir: str):
+        """
+        Removes the least recently used entries from the on-disk cache until it's within its size limit.
+
+        :param cache_dir: the cache directory.
+        """
+        try:
+            entries = []
+            with os.scandir(cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        entries.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            return
+        if len(entries) <= cls._disk_cache_max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - cls._disk_cache_max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                # Another process may have already removed it
+                pass
+
     def dbg_query_shader_templates(self,
                                    additional_template_directory: Optional[str] = None) -> List[SSVTemplatePragmaData]:
         """
@@ -334,7 +522,7 @@ class SSVShaderPreprocessor:
 
         # Now parse the template metadata
         metadata: List[Optional[SSVTemplatePragmaData]] = [
-            self._template_parser.parse(template).get("define", [None])[0] for template in templates
+            self._parse_template(template).get("define", [None])[0] for template in templates
         ]
         return [m for m in metadata if m is not None]
 
@@ -353,7 +541,7 @@ class SSVShaderPreprocessor:
                                                                     additional_templates)
 
         # Parse template args
-        template_metadata = self._template_parser.parse(template_source, template_path)
+        template_metadata = self._parse_template(template_source, template_path)
 
         # Construct and argparse using the template metadata
         template_argparse = self._make_argparse(template_metadata)
@@ -23,6 +23,8 @@ class SSVShaderSourcePreprocessor(pcpp.Preprocessor):
         super().__init__()
         self.shader_source = shader_source
         self.will_enable_line_directive = False
+        # Whether any #include directives were resolved from the filesystem rather than from pySSV's built-in shaders
+        self.opened_external_files = False
 
     def on_file_open(self, is_system_include, includepath):
         """
@@ -31,6 +33,7 @@ class SSVShaderSourcePreprocessor(pcpp.Preprocessor):
         :meta private:
         """
         if os.path.isfile(includepath):
+            self.opened_external_files = True
             return super().on_file_open(is_system_include, includepath)
 
         filename = os.path.basename(includepath)
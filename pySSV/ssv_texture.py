@@ -6,11 +6,11 @@ from typing import TYPE_CHECKING, Optional, Union
 import numpy as np
 import numpy.typing as npt
 import logging
-from PIL import Image
 
 from .ssv_logging import log
 
 if TYPE_CHECKING:
+    from PIL import Image
     from .ssv_render_process_client import SSVRenderProcessClient
     from .ssv_shader_preprocessor import SSVShaderPreprocessor
 
@@ -165,7 +165,8 @@ class SSVTexture:
         self._uniform_name = uniform_name
         self._treat_as_normalized_integer = treat_as_normalized_integer
 
-        if isinstance(data, Image.Image):
+        if not isinstance(data, np.ndarray):
+            # PIL Images (and other array-likes) can be converted without importing PIL here
             data_np = np.array(data)
         else:
             data_np = data
@@ -0,0 +1,95 @@
+#  Copyright (c) 2024 Thomas Mathieson.
+#  Distributed under the terms of the MIT license.
+
+import math
+
+import numpy as np
+
+from ..ssv_camera import SSVCamera, SSVLookCameraController, SSVOrbitCameraController, MoveDir, build_view_matrices
+
+
+def _reference_view_matrix(position, direction):
+    # The original (unoptimised) view matrix construction: translation @ rotation
+    right = np.cross(direction, (0., 1., 0.))
+    right /= np.linalg.norm(right)
+    up = np.cross(right, direction)
+    up /= np.linalg.norm(up)
+    rot = np.identity(4)
+    rot[:3, 0] = right
+    rot[:3, 1] = up
+    rot[:3, 2] = direction
+    trans = np.identity(4)
+    trans[3, :3] = -np.asarray(position)
+    return trans @ rot
+
+
+def test_view_matrix():
+    camera = SSVCamera()
+    camera.position = (1., 2., 3.)
+    direction = np.array((0.3, -0.2, -0.8))
+    camera.direction = direction / np.linalg.norm(direction)
+    np.testing.assert_allclose(camera.view_matrix, _reference_view_matrix(camera.position, camera.direction),
+                               atol=1e-5)
+
+    # Changing the camera should invalidate the cached matrices
+    camera.position[0] = -4.
+    np.testing.assert_allclose(camera.view_matrix, _reference_view_matrix(camera.position, camera.direction),
+                               atol=1e-5)
+    np.testing.assert_allclose(camera.view_projection_matrix, camera.view_matrix @ camera.projection_matrix,
+                               atol=1e-5)
+
+
+def test_projection_matrix():
+    camera = SSVCamera()
+    camera.fov = 90
+    camera.aspect_ratio = 2.
+    camera.clip_dist = (1., 11.)
+    proj = camera.projection_matrix
+    assert math.isclose(proj[0, 0], 1., rel_tol=1e-6)
+    assert math.isclose(proj[1, 1], 0.5, rel_tol=1e-6)
+    assert math.isclose(proj[2, 2], -1.1, rel_tol=1e-6)
+    assert math.isclose(proj[3, 2], -1.1, rel_tol=1e-6)
+    assert proj[2, 3] == -1 and proj[3, 3] == 0
+
+
+def test_camera_controllers():
+    look = SSVLookCameraController()
+    look.mouse_change((0, 0), (True, False, False))
+    look.mouse_change((40, -25), (True, False, False))
+    look.move(MoveDir.FORWARD, 0.5)
+    np.testing.assert_allclose(look.view_matrix, _reference_view_matrix(look.position, look.direction), atol=1e-5)
+
+    orbit = SSVOrbitCameraController()
+    orbit.mouse_change((0, 0), (True, False, False))
+    orbit.mouse_change((-60, 30), (True, False, False))
+    orbit.mouse_change((-60, 30), (False, False, False))
+    orbit.mouse_change((-50, 20), (False, False, True))
+    orbit.move(MoveDir.LEFT, 0.25)
+    np.testing.assert_allclose(np.linalg.norm(orbit.position - orbit.target_pos), orbit.orbit_dist, rtol=1e-5)
+    np.testing.assert_allclose(orbit.view_matrix, _reference_view_matrix(orbit.position, orbit.direction),
+                               atol=1e-5)
+
+
+def test_build_view_matrices():
+    rng = np.random.default_rng(42)
+    positions = rng.uniform(-10, 10, (8, 3))
+    directions = rng.uniform(-1, 1, (8, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+
+    views = build_view_matrices(positions, directions)
+    assert views.shape == (8, 4, 4)
+    for position, direction, view in zip(positions, directions, views):
+        camera = SSVCamera()
+        camera.position = position
+        camera.direction = direction
+        np.testing.assert_allclose(view, camera.view_matrix, atol=1e-5)
+
+
+def test_view_matrix_looking_along_up():
+    for direction in ((0., 1., 0.), (0., -1., 0.)):
+        camera = SSVCamera()
+        camera.direction = np.array(direction)
+        rot = camera.rotation_matrix[:3, :3].astype(np.float64)
+        assert np.all(np.isfinite(rot))
+        np.testing.assert_allclose(rot.T @ rot, np.identity(3), atol=1e-5)
+        np.testing.assert_allclose(rot[:, 2], direction, atol=1e-6)
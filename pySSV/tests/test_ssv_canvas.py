@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+#  Copyright (c) 2023-2024 Thomas Mathieson.
+#  Distributed under the terms of the MIT license.
+
+import gc
+import weakref
+
+import pytest
+
+from ..ssv_canvas import SSVCanvas
+
+
+def test_canvas_collected_after_run():
+    canvas = SSVCanvas(size=(64, 64), standalone=True)
+    canvas.run()
+    canvas.stop()
+    canvas_ref = weakref.ref(canvas)
+    finalizer = canvas._finalizer
+    del canvas
+    gc.collect()
+    assert canvas_ref() is None
+    assert not finalizer.alive
@@ -3,11 +3,18 @@
 
 import pytest
 
+from .. import ssv_shader_preprocessor
 from ..ssv_shader_preprocessor import SSVShaderPreprocessor
 from ..ssv_pragma_parser import SSVShaderPragmaParser, SSVTemplatePragmaParser
 from .test_ssv_pragma_parser import test_shader, test_template
 
 
+@pytest.fixture(autouse=True)
+def no_disk_cache(monkeypatch):
+    # Keep the tests away from the user's real shader cache
+    monkeypatch.setattr(SSVShaderPreprocessor, "_disk_cache_dir", None)
+
+
 def test_ssv_argparse():
     template_info = SSVShaderPragmaParser().parse(test_shader, "test_shader.glsl")
     template_metadata = SSVTemplatePragmaParser().parse(test_template, "test_template.glsl")
@@ -70,3 +77,74 @@ void main() {
 }
 """
 
+
+def test_ssv_preprocessor_cache():
+    preproc = SSVShaderPreprocessor(gl_version="420", supports_line_directives=True)
+    # The cache is shared between preprocessors
+    preproc._preprocess_cache.clear()
+    proc_shaders = preproc.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template])
+    cached_shaders = preproc.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template])
+    assert cached_shaders == proc_shaders
+    # Callers are free to modify the returned dict
+    assert cached_shaders is not proc_shaders
+    assert len(preproc._preprocess_cache) == 1
+
+    # Changing the global defines should invalidate the cache
+    preproc.global_defines["TEST_DEFINE"] = "1"
+    preproc.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template])
+    assert len(preproc._preprocess_cache) == 2
+
+    # A new preprocessor (eg: from re-running a notebook cell) should reuse the results of the first one
+    preproc_2 = SSVShaderPreprocessor(gl_version="420", supports_line_directives=True)
+    assert preproc_2.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template]) == proc_shaders
+    assert len(preproc._preprocess_cache) == 2
+    # But not if it targets a different GL version
+    preproc_3 = SSVShaderPreprocessor(gl_version="330", supports_line_directives=True)
+    preproc_3.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template])
+    assert len(preproc._preprocess_cache) == 3
+
+
+def test_ssv_preprocessor_disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(SSVShaderPreprocessor, "_disk_cache_dir", str(tmp_path))
+    preproc = SSVShaderPreprocessor(gl_version="420", supports_line_directives=True)
+    preproc._preprocess_cache.clear()
+    proc_shaders = preproc.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template])
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    # Simulate a kernel restart
+    preproc._preprocess_cache.clear()
+    preproc_2 = SSVShaderPreprocessor(gl_version="420", supports_line_directives=True)
+    assert preproc_2.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template]) == proc_shaders
+    assert len(preproc._preprocess_cache) == 1
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    # Make sure the result really comes from the disk
+    preproc._preprocess_cache.clear()
+    next(tmp_path.glob("*.json")).write_text('{"frag_shader": "cached"}')
+    assert preproc_2.preprocess(test_shader, "test_shader.glsl",
+                                additional_templates=[test_template]) == {"frag_shader": "cached"}
+    preproc._preprocess_cache.clear()
+
+
+def test_ssv_preprocessor_disk_cache_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(SSVShaderPreprocessor, "_disk_cache_dir", str(tmp_path))
+    monkeypatch.setattr(SSVShaderPreprocessor, "_disk_cache_max_entries", 2)
+    preproc = SSVShaderPreprocessor(gl_version="420", supports_line_directives=True)
+    preproc._preprocess_cache.clear()
+    for i in range(4):
+        preproc.global_defines["TEST_DEFINE"] = str(i)
+        preproc.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template])
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    preproc._preprocess_cache.clear()
+
+
+def test_ssv_preprocessor_disk_cache_default_dir(tmp_path, monkeypatch):
+    # The default cache location should follow XDG_CACHE_HOME even when it's set after pySSV is imported
+    monkeypatch.setattr(SSVShaderPreprocessor, "_disk_cache_dir", "")
+    monkeypatch.setattr(ssv_shader_preprocessor, "__version__", "1.0.0")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    preproc = SSVShaderPreprocessor(gl_version="420", supports_line_directives=True)
+    preproc._preprocess_cache.clear()
+    preproc.preprocess(test_shader, "test_shader.glsl", additional_templates=[test_template])
+    assert len(list((tmp_path / "pySSV" / "shaders").glob("*.json"))) == 1
+    preproc._preprocess_cache.clear()
@@ -20,6 +20,7 @@ import "../css/widget.css";
 enum StreamingMode {
   PNG = "png",
   JPG = "jpg",
+  WEBP = "webp",
   H264 = "h264",
   VP8 = "vp8",
   VP9 = "vp9",
@@ -132,6 +133,7 @@ export class SSVRenderView extends DOMWidgetView {
   private _websocket: WebSocket | null = null;
   private _video_decoder: VideoDecoder | null = null;
   private _canvas_ctx: CanvasRenderingContext2D | null = null;
+  private _frame_url: string | null = null;
 
   initialize(parameters: WidgetView.IInitializeParameters) {
     super.initialize(parameters);
@@ -189,6 +191,10 @@ export class SSVRenderView extends DOMWidgetView {
     super.remove();
 
     this.unregister_events();
+    if (this._frame_url) {
+      URL.revokeObjectURL(this._frame_url);
+      this._frame_url = null;
+    }
   }
 
   private render_canvas() {
@@ -197,6 +203,7 @@ export class SSVRenderView extends DOMWidgetView {
     switch (this._streaming_mode) {
       case StreamingMode.JPG:
       case StreamingMode.PNG:
+      case StreamingMode.WEBP:
       case StreamingMode.MJPEG:
         this._stream_element = document.createElement("img");
         this._stream_element.className = "ssv-render-viewport";
@@ -389,12 +396,22 @@ export class SSVRenderView extends DOMWidgetView {
     switch (this._streaming_mode) {
       case StreamingMode.JPG:
       case StreamingMode.PNG:
+      case StreamingMode.WEBP:
         //(this._stream_element as HTMLImageElement).src = this.model.get("stream_data");
         //(this._stream_element as HTMLImageElement).src = this._text_decoder.decode(this.model.get("stream_data"));
-        if (typeof stream_data === "string")
+        if (typeof stream_data === "string") {
           (this._stream_element as HTMLImageElement).src = stream_data as string;
-        else
-          (this._stream_element as HTMLImageElement).src = this._text_decoder.decode(stream_data);
+        } else {
+          // Binary frames are the raw encoded image, wrap them in an object URL rather than a base64 data url
+          const mime_type = this._streaming_mode === StreamingMode.JPG
+            ? "image/jpeg" : `image/${this._streaming_mode}`;
+          const blob = new Blob([stream_data], {type: mime_type});
+          const old_url = this._frame_url;
+          this._frame_url = URL.createObjectURL(blob);
+          (this._stream_element as HTMLImageElement).src = this._frame_url;
+          if (old_url)
+            URL.revokeObjectURL(old_url);
+        }
         //(this._stream_element as HTMLImageElement).src = stream_data as string;
         break;
       //case StreamingMode.MJPEG: